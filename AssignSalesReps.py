@@ -1,125 +1,463 @@
 import os
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-from xlrd import XLRDError
 
 import EnumTypes
 import ExcelUtilities
+import Normalize
 
 
-def main(std_df):
-    """Automatically fills in sales reps based on:
-    1) Master Account List (Customer -> Sales Rep)
-    2) Territories (Zip Code -> Sales Rep)
+# Entries kept in each part of the resolution cache; the least recently used are dropped beyond this
+resolution_cache_size = 100000
 
-    :param std_df: standardized data frame for the insight file
-    :return: new file with OSR column filled in
-    """
 
-    # ----------------------------------
-    #  Load the necessary lookup files
-    # ----------------------------------
+class TerritoryTable:
+    """Master Territory List compiled into a dense array indexed directly by
+    five-digit zip code, holding a code for each zip code's sales rep"""
 
-    customer_to_proper_name_map = ExcelUtilities.loadLookupFile("rootCustomerMappings.xlsx", "Sales Lookup")
-    mstr_account_list = ExcelUtilities.loadLookupFile("Master Account List.xlsx", "Allacct")
-    mstr_territory_list = ExcelUtilities.loadLookupFile("CAZipCode.xlsx", "CA_BASIC_ROSTER")
+    # Code stored for every zip code that is not in the territory list
+    OUT_OF_TERRITORY = -1
 
-    # -----------------
-    #  Find sales reps
-    # -----------------
+    def __init__(self, zip_code_col, zip_sales_rep_col):
+        self.codes = np.full(100000, self.OUT_OF_TERRITORY, dtype=np.int32)
 
-    # Pull out columns we need now to expedite indexing later
-    customer_col = customer_to_proper_name_map['Root Customer'].tolist()
-    customer_to_proper_name_col = customer_to_proper_name_map['ProperName'].tolist()
-    proper_name_col = mstr_account_list['ProperName'].tolist()
-    proper_name_to_sales_rep_col = mstr_account_list['SLS'].tolist()
-    zip_code_col = mstr_territory_list['ZipCode'].tolist()
-    zip_sales_rep_col = mstr_territory_list['Sls'].tolist()
+        # Sales rep -> code, in order of first appearance
+        sales_rep_codes = {}
+        for zip_code, sales_rep in zip(zip_code_col, zip_sales_rep_col):
+            # Zip codes are stored as numbers in the territory list; text entries never match
+            if isinstance(zip_code, bool) or not isinstance(zip_code, (int, float, np.number)):
+                continue
+            if not float(zip_code).is_integer() or not 0 <= zip_code < len(self.codes):
+                continue
+            # The first occurrence of a zip code wins
+            if self.codes[int(zip_code)] == self.OUT_OF_TERRITORY:
+                self.codes[int(zip_code)] = sales_rep_codes.setdefault(sales_rep, len(sales_rep_codes))
 
-    # Change text columns to lower-case so search isn't case-sensitive
-    customer_col = [str(item).lower() for item in customer_col]
-    customer_to_proper_name_col = [str(item).lower() for item in customer_to_proper_name_col]
-    proper_name_col = [str(item).lower() for item in proper_name_col]
+        self.sales_reps = np.array(list(sales_rep_codes) + [None], dtype=object)
 
-    # Perform sales rep lookup on each row of our standard dataframe
-    for i in std_df.index:
-        # Set pass/fail flags
-        account_list_fail = False
-        territory_list_fail = False
+    def lookup(self, zip_code):
+        """Finds the sales rep for a single zip code
 
-        # Set desired values
-        proper_name = ""
-        sales_rep = ""
+        :param zip_code: five-character zip code, blank if unusable
+        :return: sales rep, or None if out of territory
+        """
 
-        # +++ Look at account first +++
-        # Search by customer
-        customer = str(std_df.loc[i, 'Reported Customer']).lower()  # Not case-sensitive
+        try:
+            # Convert to int because that is how it is stored in master territory list
+            zip_code = int(zip_code)
+        except ValueError:
+            return None
+        if not 0 <= zip_code < len(self.codes):
+            return None
+
+        return self.sales_reps[self.codes[zip_code]]
+
+    def lookupMany(self, zip_code_prefixes):
+        """Finds the sales rep for every zip code in one gather
+
+        :param zip_code_prefixes: series of five-character zip codes, blank if unusable
+        :return: series of sales reps, None where out of territory
+        """
 
-        # If no customer provided, flag as individual, move on to territory
+        codes = np.full(len(zip_code_prefixes), self.OUT_OF_TERRITORY, dtype=np.int32)
+
+        usable = zip_code_prefixes.str.fullmatch(r"\d{5}").fillna(False).to_numpy(dtype=bool)
+        codes[usable] = self.codes[zip_code_prefixes[usable].astype(int).to_numpy()]
+
+        # The sentinel indexes the trailing None in sales_reps
+        return pd.Series(self.sales_reps[codes], index=zip_code_prefixes.index)
+
+
+class SalesRepIndex:
+    """Hashed look-ups built once from the customer-proper name map,
+    the Master Account List and the Master Territory List"""
+
+    def __init__(self, customer_to_proper_name_map, mstr_account_list, mstr_territory_list):
+        # Change text columns to lower-case so search isn't case-sensitive
+        customer_col = [str(item).lower() for item in customer_to_proper_name_map['Root Customer'].tolist()]
+        customer_to_proper_name_col = [str(item).lower() for item in customer_to_proper_name_map['ProperName'].tolist()]
+        proper_name_col = [str(item).lower() for item in mstr_account_list['ProperName'].tolist()]
+
+        # Customers that are already proper names
+        self.proper_names = set(customer_to_proper_name_col) | set(proper_name_col)
+
+        # Customer -> first occurrence that has an associated proper name (blank if none do)
+        self.customer_to_proper_name = {}
+        for customer, proper_name in zip(customer_col, customer_to_proper_name_col):
+            if not self.customer_to_proper_name.get(customer):
+                self.customer_to_proper_name[customer] = proper_name
+
+        # Proper name -> sales rep of its first occurrence in the Master Account List
+        self.proper_name_to_sales_rep = {}
+        for proper_name, sales_rep in zip(proper_name_col, mstr_account_list['SLS'].tolist()):
+            self.proper_name_to_sales_rep.setdefault(proper_name, sales_rep)
+
+        # Zip code -> sales rep, as a dense array
+        self.territory = TerritoryTable(mstr_territory_list['ZipCode'].tolist(), mstr_territory_list['Sls'].tolist())
+
+    def resolveCustomer(self, customer):
+        """Maps a reported customer to its proper name, then to its sales rep
+
+        :param customer: lowercase reported customer
+        :return: proper name, sales rep and flag; flag is None if the account was found
+        """
+
+        # If no customer provided, flag as individual
         if not customer:
-            std_df.loc[i, 'Flag'] = EnumTypes.Flag.CNP.value
-            account_list_fail = True
-
-        # If customer provided, map customer to its proper name
-        if not account_list_fail:
-            # Look first in the proper name column of customer-proper name map
-            if customer in customer_to_proper_name_col or customer in proper_name_col:
-                proper_name = customer
-            elif customer in customer_col:  # Then look in customer column
-                # Look for all occurrences of this customer within the customer column
-                for index, elem in enumerate(customer_col):
-                    if elem == customer:
-                        customer_index = index
-                        proper_name = customer_to_proper_name_col[customer_index]
-                        if proper_name:  # Use the first occurrence that has an associated proper name
-                            break
-                # If the proper name is blank
-                if not proper_name:
-                    # No proper name associated
-                    std_df.loc[i, 'Flag'] = EnumTypes.Flag.PNA.value
-                    account_list_fail = True
-            else:
-                # Customer not found in Customer to Proper Name Map (New Account)
-                std_df.loc[i, 'Flag'] = EnumTypes.Flag.CNF.value
-                account_list_fail = True
-
-        if not account_list_fail:
-            # Find sales rep by proper name
-            if proper_name in proper_name_col:
-                proper_name_index = proper_name_col.index(str(proper_name).lower())  # Ignore case
-                sales_rep = proper_name_to_sales_rep_col[proper_name_index]
+            return "", "", EnumTypes.Flag.CNP.value
+
+        # Look first in the proper name columns, then in the customer column
+        if customer in self.proper_names:
+            proper_name = customer
+        elif customer in self.customer_to_proper_name:
+            proper_name = self.customer_to_proper_name[customer]
+            if not proper_name:
+                # No proper name associated
+                return "", "", EnumTypes.Flag.PNA.value
+        else:
+            # Customer not found in Customer to Proper Name Map (New Account)
+            return "", "", EnumTypes.Flag.CNF.value
+
+        # Find sales rep by proper name
+        if proper_name in self.proper_name_to_sales_rep:
+            return proper_name, self.proper_name_to_sales_rep[proper_name], None
+
+        # Proper name not found in Master Account List
+        return proper_name, "", EnumTypes.Flag.PNF.value
+
+    def findAccountSalesRep(self, customer):
+        """Maps a reported customer to its proper name, then to its sales rep
+
+        :param customer: lowercase reported customer
+        :return: sales rep and flag; flag is None if the account was found
+        """
+
+        return self.resolveCustomer(customer)[1:]
+
+    def findTerritorySalesRep(self, zip_code):
+        """Maps the first five digits of a zip code to its sales rep
+
+        :param zip_code: five-character zip code, blank if unusable
+        :return: sales rep, or None if out of territory
+        """
+
+        return self.territory.lookup(zip_code)
+
+
+class ResolutionCache:
+    """Reported customer -> (proper name, sales rep, flag) and zip code -> (sales rep, flag)
+    resolutions kept between runs, so customers that come up in every report are resolved
+    once per version of the lookup files; flags are blank where the look-up succeeded, and
+    the least recently used entries are dropped beyond resolution_cache_size"""
+
+    def __init__(self, fingerprint, customers=None, zip_codes=None):
+        self.fingerprint = fingerprint
+        # Oldest first, so the least recently used entry is the first one dropped
+        self.customers = OrderedDict() if customers is None else customers
+        self.zip_codes = OrderedDict() if zip_codes is None else zip_codes
+        self.changed = False
+
+    def entries(self, cache, keys, resolveMisses):
+        """Finds the cached entry for each key, resolving and storing the rest
+
+        :param cache: customers or zip_codes
+        :param keys: unique keys to look up
+        :param resolveMisses: function resolving a list of keys to a list of entries
+        :return: entry for each key, number of keys that were cached
+        """
+
+        found = {}
+        missed = []
+        for key in keys:
+            entry = cache.get(key)
+            if entry is None:
+                missed.append(key)
             else:
-                # Proper name not found in Master Account List
-                std_df.loc[i, 'Flag'] = EnumTypes.Flag.PNF.value
-                account_list_fail = True
+                cache.move_to_end(key)
+                found[key] = entry
+
+        if missed:
+            for key, entry in zip(missed, resolveMisses(missed)):
+                cache[key] = entry
+                found[key] = entry
+            self.changed = True
+
+        # Also trims a cache saved with a larger size limit
+        while len(cache) > resolution_cache_size:
+            cache.popitem(last=False)
+            self.changed = True
+
+        return [found[key] for key in keys], len(keys) - len(missed)
+
+    def customerEntries(self, customers, lookups):
+        """Resolves each reported customer to its proper name, sales rep and flag
+
+        :param customers: unique lowercase reported customers
+        :param lookups: lookup tables, only indexed if a customer isn't cached
+        :return: entry for each customer, number of customers that were cached
+        """
+
+        def resolveCustomers(missed):
+            sales_rep_index = lookups.sales_rep_index
+            return [(proper_name, sales_rep, flag or "") for proper_name, sales_rep, flag
+                    in map(sales_rep_index.resolveCustomer, missed)]
+
+        return self.entries(self.customers, customers, resolveCustomers)
+
+    def zipCodeEntries(self, zip_code_prefixes, lookups):
+        """Resolves each zip code to its sales rep and flag
+
+        :param zip_code_prefixes: unique five-character zip codes, blank if unusable
+        :param lookups: lookup tables, only indexed if a zip code isn't cached
+        :return: entry for each zip code, number of zip codes that were cached
+        """
+
+        def resolveZipCodes(missed):
+            sales_reps = lookups.sales_rep_index.territory.lookupMany(pd.Series(missed, dtype=object))
+            # Zip code not found in Master Territory List
+            return [("", EnumTypes.Flag.OOT.value) if out_of_territory else (sales_rep, "")
+                    for sales_rep, out_of_territory in zip(sales_reps, sales_reps.isna())]
+
+        return self.entries(self.zip_codes, zip_code_prefixes, resolveZipCodes)
+
+    def save(self):
+        """Saves the resolutions for the next run, if any were added"""
+
+        if not self.changed:
+            return
+
+        # Other Clean workers may have saved since this cache was loaded, so keep their entries too
+        cache_path = resolutionCachePath()
+        with ExcelUtilities.cacheFileLock(cache_path):
+            saved = ExcelUtilities.readCacheFile(cache_path, self.fingerprint)
+            if saved is not None:
+                self.customers = mergeEntries(saved["customers"], self.customers)
+                self.zip_codes = mergeEntries(saved["zip_codes"], self.zip_codes)
+            ExcelUtilities.writeCacheFile(cache_path, self.fingerprint,
+                                          {"customers": self.customers, "zip_codes": self.zip_codes},
+                                          "customer resolutions")
+        self.changed = False
+
+
+def mergeEntries(saved, cache):
+    """Combines the entries saved by another process with this one's,
+    counting this process's entries as the most recently used
+
+    :param saved: entries in the saved cache file
+    :param cache: this process's entries
+    :return: combined entries, least recently used first
+    """
+
+    merged = OrderedDict((key, entry) for key, entry in saved.items() if key not in cache)
+    merged.update(cache)
+    while len(merged) > resolution_cache_size:
+        merged.popitem(last=False)
+    return merged
+
+
+def resolutionCachePath():
+    """Names the file the resolution cache is saved in
+
+    :return: path to the cache file
+    """
+
+    return os.path.join(ExcelUtilities.cache_dir, "resolutions.pkl")
+
+
+def loadResolutionCache(fingerprint):
+    """Loads the resolutions saved by earlier runs; they are all dropped
+    once the customer map, account list or territory list changes
+
+    :param fingerprint: fingerprint of the customer map, account list and territory list
+    :return: resolution cache
+    """
+
+    saved = ExcelUtilities.readCacheFile(resolutionCachePath(), fingerprint)
+    if saved is None:
+        return ResolutionCache(fingerprint)
+    return ResolutionCache(fingerprint, saved["customers"], saved["zip_codes"])
+
+
+def hitRate(hits, total):
+    """Describes how many look-ups the resolution cache answered
+
+    :param hits: look-ups answered from the cache
+    :param total: all look-ups
+    :return: text for the console
+    """
+
+    if not total:
+        return "none looked up"
+    return str(round(100 * hits / total, 1)) + "% (" + str(hits) + " of " + str(total) + ")"
+
+
+def assignByRow(std_df, sales_rep_index, zip_code_prefixes):
+    """Runs the account -> territory cascade one row at a time
+
+    :param std_df: standardized data frame for the insight file
+    :param sales_rep_index: look-ups built from the lookup files
+    :param zip_code_prefixes: first five digits of each zip code
+    :return: data frame with OSR and Flag columns filled in
+    """
+
+    for i in std_df.index:
+        # +++ Look at account first +++
+        customer = str(std_df.loc[i, 'Reported Customer']).lower()  # Not case-sensitive
+        sales_rep, flag = sales_rep_index.findAccountSalesRep(customer)
 
         # +++ If that doesn't work, find by zip code +++
-        if account_list_fail:
-            # Get zip code
-            zip_code = str(std_df.loc[i, 'Zip Code'])
-
-            # Only care about precision to the first five digits
-            if len(zip_code) == 10:
-                zip_code = zip_code[:5]
-            elif len(zip_code) != 5:  # Zip code too small or too large, out of territory
+        if flag:
+            std_df.loc[i, 'Flag'] = flag
+            sales_rep = sales_rep_index.findTerritorySalesRep(zip_code_prefixes[i])
+            if sales_rep is None:
+                # Zip code not found in Master Territory List
                 std_df.loc[i, 'Flag'] = EnumTypes.Flag.OOT.value
-                territory_list_fail = True
-
-            if not territory_list_fail:
-                try:
-                    # Convert to int because that is how it is stored in master territory list
-                    zip_code = int(zip_code)
-                    zip_code_index = zip_code_col.index(zip_code)
-                    sales_rep = zip_sales_rep_col[zip_code_index]
-                except (ValueError, IndexError):
-                    # Zip code not found in Master Territory List
-                    std_df.loc[i, 'Flag'] = EnumTypes.Flag.OOT.value
-                    territory_list_fail = True
 
         # +++ Save sales rep to our data frame +++
-        if not account_list_fail or not territory_list_fail:
+        if sales_rep is not None:
             std_df.loc[i, 'OSR'] = sales_rep
 
     return std_df
 
 
+def assignByColumn(std_df, sales_rep_index, zip_code_prefixes):
+    """Runs the same account -> territory cascade as assignByRow,
+    but as whole-column look-ups and masks
+
+    :param std_df: standardized data frame for the insight file
+    :param sales_rep_index: look-ups built from the lookup files
+    :param zip_code_prefixes: first five digits of each zip code
+    :return: data frame with OSR and Flag columns filled in
+    """
+
+    if std_df.empty:
+        return std_df
+
+    # +++ Look at account first +++
+    customers = std_df['Reported Customer'].map(str).str.lower()  # Not case-sensitive
+
+    # Map each customer to its proper name (NaN if not in the customer column)
+    is_proper_name = customers.isin(sales_rep_index.proper_names)
+    mapped_proper_names = customers.map(sales_rep_index.customer_to_proper_name)
+    proper_names = customers.where(is_proper_name, mapped_proper_names)
+
+    # Map each proper name to its sales rep
+    in_account_list = proper_names.isin(list(sales_rep_index.proper_name_to_sales_rep))
+    account_sales_reps = proper_names.map(sales_rep_index.proper_name_to_sales_rep)
+
+    # Order of conditions determines precedence of flags
+    no_customer = customers == ""
+    not_in_map = ~no_customer & ~is_proper_name & mapped_proper_names.isna()
+    no_proper_name = ~no_customer & ~is_proper_name & (mapped_proper_names == "")
+    account_flags = pd.Series(np.select(
+        [no_customer, not_in_map, no_proper_name, ~in_account_list],
+        [EnumTypes.Flag.CNP.value, EnumTypes.Flag.CNF.value, EnumTypes.Flag.PNA.value, EnumTypes.Flag.PNF.value],
+        default=""), index=std_df.index)
+    account_list_fail = account_flags != ""
+
+    # +++ If that doesn't work, find by zip code +++
+    territory_sales_reps = sales_rep_index.territory.lookupMany(zip_code_prefixes)
+    territory_list_fail = account_list_fail & territory_sales_reps.isna()
+
+    # +++ Save flags and sales reps to our data frame +++
+    std_df.loc[account_list_fail, 'Flag'] = account_flags[account_list_fail]
+    std_df.loc[territory_list_fail, 'Flag'] = EnumTypes.Flag.OOT.value
+
+    account_found = ~account_list_fail
+    territory_found = account_list_fail & ~territory_list_fail
+    std_df.loc[account_found, 'OSR'] = account_sales_reps[account_found]
+    std_df.loc[territory_found, 'OSR'] = territory_sales_reps[territory_found]
+
+    return std_df
+
+
+def assignByCache(std_df, lookups, resolution_cache, zip_code_prefixes):
+    """Runs the same account -> territory cascade as assignByColumn, but
+    resolves each distinct customer and zip code once, through the resolution cache
+
+    :param std_df: standardized data frame for the insight file
+    :param lookups: lookup tables loaded for this batch
+    :param resolution_cache: resolutions saved by earlier runs
+    :param zip_code_prefixes: first five digits of each zip code
+    :return: data frame with OSR and Flag columns filled in
+    """
+
+    if std_df.empty:
+        return std_df
+
+    # +++ Look at account first +++
+    customers = std_df['Reported Customer'].map(str).str.lower()  # Not case-sensitive
+    unique_customers = pd.unique(customers)
+    customer_entries, customer_hits = resolution_cache.customerEntries(list(unique_customers), lookups)
+    positions = pd.Index(unique_customers).get_indexer(customers)
+    account_sales_reps = np.array([sales_rep for _, sales_rep, _ in customer_entries], dtype=object)[positions]
+    account_flags = np.array([flag for _, _, flag in customer_entries], dtype=object)[positions]
+    account_list_fail = account_flags != ""
+
+    # +++ If that doesn't work, find by zip code +++
+    territory_sales_reps = np.full(len(std_df), "", dtype=object)
+    territory_flags = np.full(len(std_df), "", dtype=object)
+    failed_zip_codes = zip_code_prefixes[account_list_fail]
+    unique_zip_codes = pd.unique(failed_zip_codes)
+    zip_code_entries, zip_code_hits = resolution_cache.zipCodeEntries(list(unique_zip_codes), lookups)
+    if zip_code_entries:
+        positions = pd.Index(unique_zip_codes).get_indexer(failed_zip_codes)
+        territory_sales_reps[account_list_fail] = np.array([sales_rep for sales_rep, _ in zip_code_entries],
+                                                           dtype=object)[positions]
+        territory_flags[account_list_fail] = np.array([flag for _, flag in zip_code_entries], dtype=object)[positions]
+    territory_list_fail = account_list_fail & (territory_flags != "")
+
+    print("> Resolution cache hits: customers " + hitRate(customer_hits, len(customer_entries)) +
+          ", zip codes " + hitRate(zip_code_hits, len(zip_code_entries)))
+
+    # +++ Save flags and sales reps to our data frame +++
+    std_df.loc[account_list_fail, 'Flag'] = account_flags[account_list_fail]
+    std_df.loc[territory_list_fail, 'Flag'] = territory_flags[territory_list_fail]
+
+    account_found = ~account_list_fail
+    territory_found = account_list_fail & ~territory_list_fail
+    std_df.loc[account_found, 'OSR'] = account_sales_reps[account_found]
+    std_df.loc[territory_found, 'OSR'] = territory_sales_reps[territory_found]
+
+    return std_df
+
+
+def main(std_df, lookups, vectorized=True, cached=True):
+    """Automatically fills in sales reps based on:
+    1) Master Account List (Customer -> Sales Rep)
+    2) Territories (Zip Code -> Sales Rep)
+
+    :param std_df: standardized data frame for the insight file
+    :param lookups: lookup tables loaded for this batch
+    :param vectorized: run the look-ups as whole-column operations
+                       instead of one row at a time
+    :param cached: resolve customers and zip codes through the resolution cache
+                   saved by earlier runs (only when vectorized)
+    :return: new file with OSR column filled in
+    """
+
+    # -----------------
+    #  Find sales reps
+    # -----------------
+
+    # Territory look-up only cares about the first five digits of each zip code
+    zip_code_prefixes = Normalize.zipCodePrefixes(std_df['Zip Code'])
+
+    # Perform sales rep lookup on each row of our standard dataframe
+    if vectorized and cached:
+        # The look-ups are only built for customers and zip codes earlier runs haven't seen
+        resolution_cache = lookups.resolution_cache
+        std_df = assignByCache(std_df, lookups, resolution_cache, zip_code_prefixes)
+        resolution_cache.save()
+    elif vectorized:
+        # Look-ups were built once for the whole batch instead of searching lists for every row
+        std_df = assignByColumn(std_df, lookups.sales_rep_index, zip_code_prefixes)
+    else:
+        std_df = assignByRow(std_df, lookups.sales_rep_index, zip_code_prefixes)
+
+    return std_df
+
+
 
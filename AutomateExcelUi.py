@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'AutomateExcel.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_AutomateExcel(object):
+    def setupUi(self, AutomateExcel):
+        AutomateExcel.setObjectName("AutomateExcel")
+        AutomateExcel.resize(900, 600)
+        self.btnSelectFiles = QtWidgets.QPushButton(AutomateExcel)
+        self.btnSelectFiles.setGeometry(QtCore.QRect(40, 40, 251, 51))
+        self.btnSelectFiles.setObjectName("btnSelectFiles")
+        self.txtConsole = QtWidgets.QTextEdit(AutomateExcel)
+        self.txtConsole.setGeometry(QtCore.QRect(390, 260, 481, 271))
+        font = QtGui.QFont()
+        font.setFamily("Dubai Medium")
+        font.setPointSize(10)
+        font.setBold(False)
+        font.setWeight(50)
+        self.txtConsole.setFont(font)
+        self.txtConsole.setReadOnly(True)
+        self.txtConsole.setObjectName("txtConsole")
+        self.lblTaarcomImage = QtWidgets.QLabel(AutomateExcel)
+        self.lblTaarcomImage.setGeometry(QtCore.QRect(520, 40, 201, 201))
+        self.lblTaarcomImage.setAcceptDrops(True)
+        self.lblTaarcomImage.setAutoFillBackground(True)
+        self.lblTaarcomImage.setText("")
+        self.lblTaarcomImage.setPixmap(QtGui.QPixmap("TAARCOM.png"))
+        self.lblTaarcomImage.setScaledContents(True)
+        self.lblTaarcomImage.setObjectName("lblTaarcomImage")
+        self.lblTxtExcelOperations = QtWidgets.QLabel(AutomateExcel)
+        self.lblTxtExcelOperations.setGeometry(QtCore.QRect(50, 340, 301, 41))
+        font = QtGui.QFont()
+        font.setFamily("Century Gothic")
+        font.setPointSize(20)
+        self.lblTxtExcelOperations.setFont(font)
+        self.lblTxtExcelOperations.setAlignment(QtCore.Qt.AlignCenter)
+        self.lblTxtExcelOperations.setObjectName("lblTxtExcelOperations")
+        self.lblTxtCurrentFile = QtWidgets.QLabel(AutomateExcel)
+        self.lblTxtCurrentFile.setGeometry(QtCore.QRect(40, 100, 111, 31))
+        font = QtGui.QFont()
+        font.setPointSize(10)
+        self.lblTxtCurrentFile.setFont(font)
+        self.lblTxtCurrentFile.setObjectName("lblTxtCurrentFile")
+        self.lblSelectedFiles = QtWidgets.QLabel(AutomateExcel)
+        self.lblSelectedFiles.setGeometry(QtCore.QRect(40, 130, 331, 211))
+        font = QtGui.QFont()
+        font.setPointSize(9)
+        self.lblSelectedFiles.setFont(font)
+        self.lblSelectedFiles.setAlignment(QtCore.Qt.AlignLeading|QtCore.Qt.AlignLeft|QtCore.Qt.AlignTop)
+        self.lblSelectedFiles.setWordWrap(False)
+        self.lblSelectedFiles.setObjectName("lblSelectedFiles")
+        self.btnClearConsole = QtWidgets.QPushButton(AutomateExcel)
+        self.btnClearConsole.setGeometry(QtCore.QRect(560, 540, 131, 28))
+        self.btnClearConsole.setObjectName("btnClearConsole")
+        self.btnClean = QtWidgets.QPushButton(AutomateExcel)
+        self.btnClean.setGeometry(QtCore.QRect(100, 390, 231, 41))
+        self.btnClean.setObjectName("btnClean")
+        self.btnCompile = QtWidgets.QPushButton(AutomateExcel)
+        self.btnCompile.setGeometry(QtCore.QRect(100, 490, 231, 41))
+        self.btnCompile.setObjectName("btnCompile")
+        self.lblTxtExcelOperations_2 = QtWidgets.QLabel(AutomateExcel)
+        self.lblTxtExcelOperations_2.setGeometry(QtCore.QRect(60, 390, 31, 41))
+        font = QtGui.QFont()
+        font.setFamily("Century Gothic")
+        font.setPointSize(16)
+        self.lblTxtExcelOperations_2.setFont(font)
+        self.lblTxtExcelOperations_2.setScaledContents(False)
+        self.lblTxtExcelOperations_2.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.lblTxtExcelOperations_2.setObjectName("lblTxtExcelOperations_2")
+        self.lblTxtExcelOperations_3 = QtWidgets.QLabel(AutomateExcel)
+        self.lblTxtExcelOperations_3.setGeometry(QtCore.QRect(60, 440, 31, 41))
+        font = QtGui.QFont()
+        font.setFamily("Century Gothic")
+        font.setPointSize(16)
+        self.lblTxtExcelOperations_3.setFont(font)
+        self.lblTxtExcelOperations_3.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.lblTxtExcelOperations_3.setObjectName("lblTxtExcelOperations_3")
+        self.btnDeselectFiles = QtWidgets.QPushButton(AutomateExcel)
+        self.btnDeselectFiles.setGeometry(QtCore.QRect(300, 40, 51, 51))
+        icon = QtGui.QIcon()
+        icon.addPixmap(QtGui.QPixmap("clear-file.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        self.btnDeselectFiles.setIcon(icon)
+        self.btnDeselectFiles.setIconSize(QtCore.QSize(30, 30))
+        self.btnDeselectFiles.setObjectName("btnDeselectFiles")
+        self.comboCompany = QtWidgets.QComboBox(AutomateExcel)
+        self.comboCompany.setGeometry(QtCore.QRect(360, 50, 81, 31))
+        self.comboCompany.setLayoutDirection(QtCore.Qt.LeftToRight)
+        self.comboCompany.setObjectName("comboCompany")
+        self.comboCompany.addItem("")
+        self.comboCompany.addItem("")
+        self.comboCompany.addItem("")
+        self.comboCompany.addItem("")
+        self.btnSplit = QtWidgets.QPushButton(AutomateExcel)
+        self.btnSplit.setGeometry(QtCore.QRect(100, 440, 231, 41))
+        self.btnSplit.setObjectName("btnSplit")
+        self.lblTxtExcelOperations_4 = QtWidgets.QLabel(AutomateExcel)
+        self.lblTxtExcelOperations_4.setGeometry(QtCore.QRect(60, 490, 31, 41))
+        font = QtGui.QFont()
+        font.setFamily("Century Gothic")
+        font.setPointSize(16)
+        self.lblTxtExcelOperations_4.setFont(font)
+        self.lblTxtExcelOperations_4.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
+        self.lblTxtExcelOperations_4.setObjectName("lblTxtExcelOperations_4")
+
+        self.retranslateUi(AutomateExcel)
+        QtCore.QMetaObject.connectSlotsByName(AutomateExcel)
+
+    def retranslateUi(self, AutomateExcel):
+        _translate = QtCore.QCoreApplication.translate
+        AutomateExcel.setWindowTitle(_translate("AutomateExcel", "Adjust File Screen"))
+        self.btnSelectFiles.setText(_translate("AutomateExcel", "Select Files"))
+        self.txtConsole.setHtml(_translate("AutomateExcel", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
+"<html><head><meta name=\"qrichtext\" content=\"1\" /><style type=\"text/css\">\n"
+"p, li { white-space: pre-wrap; }\n"
+"</style></head><body style=\" font-family:\'Dubai Medium\'; font-size:10pt; font-weight:400; font-style:normal;\">\n"
+"<p style=\"-qt-paragraph-type:empty; margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><br /></p></body></html>"))
+        self.lblTxtExcelOperations.setText(_translate("AutomateExcel", "Excel Operations"))
+        self.lblTxtCurrentFile.setText(_translate("AutomateExcel", "<html><head/><body><p><span style=\" text-decoration: underline;\">Current Files:</span></p></body></html>"))
+        self.lblSelectedFiles.setText(_translate("AutomateExcel", "<No Files Selected>"))
+        self.btnClearConsole.setText(_translate("AutomateExcel", "Clear Console"))
+        self.btnClean.setText(_translate("AutomateExcel", "Clean"))
+        self.btnCompile.setText(_translate("AutomateExcel", "Compile"))
+        self.lblTxtExcelOperations_2.setText(_translate("AutomateExcel", "1."))
+        self.lblTxtExcelOperations_3.setText(_translate("AutomateExcel", "2."))
+        self.comboCompany.setItemText(0, _translate("AutomateExcel", "Company"))
+        self.comboCompany.setItemText(1, _translate("AutomateExcel", "DGK"))
+        self.comboCompany.setItemText(2, _translate("AutomateExcel", "MOU"))
+        self.comboCompany.setItemText(3, _translate("AutomateExcel", "ABR"))
+        self.btnSplit.setText(_translate("AutomateExcel", "Split"))
+        self.lblTxtExcelOperations_4.setText(_translate("AutomateExcel", "3."))
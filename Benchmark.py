@@ -0,0 +1,391 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+import AssignSalesReps
+import Compile
+import EnumTypes
+import ExcelUtilities
+import FillEndProducts
+import GetAbraconFlags
+import LookupTables
+import Split
+import StandardizeColumns
+
+
+# Row counts benchmarked when none are given
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Sales reps and territory shared by every synthetic lookup table
+SALES_REPS = ["AB", "CD", "EF", "GH", "IJ", "KL", "MN", "OP", "QR", "ST", "UV", "WX"]
+CA_ZIP_CODES = np.arange(90001, 96162)
+
+# Each company's insight files name their columns differently
+INSIGHT_COLUMNS = {
+    EnumTypes.Company.DGK: {'Reported Customer': "Customer Name", 'Part Number': "Mfr Part Number",
+                            'Quantity': "Qty Shipped", 'Unit Price': "Unit Price", 'Zip Code': "Zip",
+                            'Phone': "Phone Number", 'Customer Class': "Class", 'First Name': "First Name",
+                            'Last Name': "Last Name"},
+    EnumTypes.Company.MOU: {'Reported Customer': "Company", 'Part Number': "Mouser Part",
+                            'Quantity': "Quantity", 'Invoiced Dollars': "Ext Price", 'Zip Code': "Postal Code",
+                            'Phone': "Tel", 'First Name': "FName", 'Last Name': "LName"},
+    EnumTypes.Company.ABR: {'Reported Customer': "End Customer", 'Part Number': "Part", 'Quantity': "QTY",
+                            'Unit Price': "Price", 'Invoiced Dollars': "Sales", 'Zip Code': "Ship Zip",
+                            'Customer Class': "Segment", 'Reported Distributor': "Distributor"},
+}
+
+
+# ----------------------
+#  Synthetic input data
+# ----------------------
+
+def customerNames(count):
+    """Names every synthetic customer
+
+    :param count: number of customers
+    :return: array of customer names
+    """
+
+    return np.array(["Customer " + str(i) for i in range(count)], dtype=object)
+
+
+def makeLookupFiles(lookup_dir, customers, seed=0):
+    """Writes a full set of synthetic lookup files, shaped like the real ones
+
+    :param lookup_dir: folder to write the lookup files in
+    :param customers: number of distinct customers
+    :param seed: random seed
+    """
+
+    rng = np.random.default_rng(seed)
+    names = customerNames(customers)
+
+    # Root column library: root columns across the top, known aliases underneath
+    library = {}
+    for company_columns in INSIGHT_COLUMNS.values():
+        for root_col, ins_col in company_columns.items():
+            library.setdefault(root_col, []).append(ins_col)
+    root_cols = ['Reported Customer', 'Part Number', 'Reported Distributor', 'Principal', 'Quantity', 'Unit Price',
+                 'Invoiced Dollars', 'Name', 'Zip Code', 'Phone', 'Customer Class', 'OSR', 'First Name', 'Last Name']
+    depth = max(len(aliases) for aliases in library.values())
+    for root_col in root_cols:
+        aliases = library.setdefault(root_col, [])
+        aliases += [""] * (depth - len(aliases))
+    root_column_library = pd.DataFrame({root_col: library[root_col] for root_col in root_cols})
+
+    # Most customers map to a proper name; some map to a blank one
+    proper_names = np.array(["Proper " + str(i) for i in range(customers // 2 + 1)], dtype=object)
+    mapped = names[rng.random(customers) < 0.8]
+    mapped_proper_names = proper_names[rng.integers(0, len(proper_names), len(mapped))]
+    mapped_proper_names[rng.random(len(mapped)) < 0.05] = ""
+    customer_to_proper_name_map = pd.DataFrame({'Root Customer': mapped, 'ProperName': mapped_proper_names})
+
+    # Most proper names are on the account list, some with no sales rep yet
+    accounts = proper_names[rng.random(len(proper_names)) < 0.9]
+    account_reps = np.array(SALES_REPS + [""], dtype=object)[rng.integers(0, len(SALES_REPS) + 1, len(accounts))]
+    mstr_account_list = pd.DataFrame({'ProperName': accounts, 'SLS': account_reps})
+
+    # Every California zip code belongs to a sales rep
+    territory_reps = np.array(SALES_REPS, dtype=object)[rng.integers(0, len(SALES_REPS), len(CA_ZIP_CODES))]
+    mstr_territory_list = pd.DataFrame({'ZipCode': CA_ZIP_CODES, 'Sls': territory_reps})
+
+    end_product_map = pd.DataFrame({'Proper Name': accounts,
+                                    'End Product': np.array(["Industrial", "Medical", "Automotive", "IoT"],
+                                                            dtype=object)[rng.integers(0, 4, len(accounts))]})
+
+    os.makedirs(lookup_dir, exist_ok=True)
+    for filename, sheet_name, sheet_data in [
+            ("RootColumnLibrary.xlsx", "Standardize Columns", root_column_library),
+            ("rootCustomerMappings.xlsx", "Sales Lookup", customer_to_proper_name_map),
+            ("Master Account List.xlsx", "Allacct", mstr_account_list),
+            ("CAZipCode.xlsx", "CA_BASIC_ROSTER", mstr_territory_list),
+            ("EndProductMap.xlsx", "EndProductLookup", end_product_map)]:
+        sheet_data.to_excel(os.path.join(lookup_dir, filename), sheet_name=sheet_name, index=False)
+
+
+def makeInsightData(company, rows, customers, seed=0):
+    """Builds a synthetic insight report for one company
+
+    :param company: company the report pretends to come from
+    :param rows: number of orders
+    :param customers: number of distinct customers (as in the lookup files)
+    :param seed: random seed
+    :return: insight data frame, fill color of each row's first cell (blank if none)
+    """
+
+    rng = np.random.default_rng(seed)
+    names = customerNames(customers)
+
+    # Mostly known customers, some new ones and some individuals (no company)
+    reported_customers = names[rng.integers(0, customers, rows)]
+    new_accounts = rng.random(rows) < 0.1
+    new_account_ids = rng.integers(0, 10 * customers, new_accounts.sum()).astype(str)
+    reported_customers[new_accounts] = np.char.add("New Co ", new_account_ids)
+    reported_customers[rng.random(rows) < 0.05] = ""
+
+    # Mostly California zip codes in every format the cleaner handles, some out of state
+    zip_codes = CA_ZIP_CODES[rng.integers(0, len(CA_ZIP_CODES), rows)]
+    out_of_state = rng.random(rows) < 0.1
+    zip_codes[out_of_state] = rng.integers(10000, 89999, out_of_state.sum())
+    zip_strings = zip_codes.astype(str).astype(object)
+    plus_four = rng.random(rows) < 0.3
+    zip_strings[plus_four] = zip_strings[plus_four] + "-" + rng.integers(1000, 9999, plus_four.sum()).astype(str)
+
+    quantities = rng.integers(1, 5000, rows)
+    unit_prices = np.round(rng.random(rows) * 20, 2)
+    values = {
+        'Reported Customer': reported_customers,
+        'Part Number': np.char.add("PN-", rng.integers(0, 50000, rows).astype(str)),
+        'Reported Distributor': np.full(rows, "Arrow", dtype=object),
+        'Quantity': quantities,
+        'Unit Price': unit_prices,
+        'Invoiced Dollars': np.round(quantities * unit_prices, 2),
+        'Zip Code': zip_strings,
+        'Phone': np.char.add("1-408-555-", rng.integers(1000, 9999, rows).astype(str)),
+        'Customer Class': np.array(["OEM", "CEM", "Individual"], dtype=object)[rng.integers(0, 3, rows)],
+        'First Name': np.array(["Ann", "Bob", "Cy", "Di"], dtype=object)[rng.integers(0, 4, rows)],
+        'Last Name': np.array(["Lee", "Kim", "Ng", "Ito"], dtype=object)[rng.integers(0, 4, rows)],
+    }
+    ins_df = pd.DataFrame({ins_col: values[root_col] for root_col, ins_col in INSIGHT_COLUMNS[company].items()})
+
+    # Abracon color-codes some of its rows
+    colors = np.full(rows, "", dtype=object)
+    if company == EnumTypes.Company.ABR:
+        flag_colors = np.array([EnumTypes.AbraconFlags.YELLOW_HEX.value, EnumTypes.AbraconFlags.GREEN_HEX.value,
+                                EnumTypes.AbraconFlags.ORANGE_HEX.value], dtype=object)
+        flagged = rng.random(rows) < 0.15
+        colors[flagged] = flag_colors[rng.integers(0, 3, flagged.sum())]
+
+    return ins_df, colors
+
+
+def writeInsightFile(filepath, ins_df, colors):
+    """Writes a synthetic insight report to disk, color-coding first cells where asked
+
+    :param filepath: path for the insight file
+    :param ins_df: insight data frame
+    :param colors: fill color of each row's first cell (blank if none)
+    """
+
+    book = xlsxwriter.Workbook(filepath, {'constant_memory': True})
+    sheet = book.add_worksheet()
+    fills = {color: book.add_format({'bg_color': "#" + color, 'pattern': 1}) for color in set(colors) if color}
+
+    sheet.write_row(0, 0, list(ins_df.columns))
+    for row_idx, (row, color) in enumerate(zip(ins_df.itertuples(index=False), colors)):
+        sheet.write_row(row_idx + 1, 0, row)
+        if color:
+            sheet.write(row_idx + 1, 0, row[0], fills[color])
+
+    book.close()
+
+
+# ------------
+#  Benchmarks
+# ------------
+
+def timeStage(results, company, rows, stage, fn, *args):
+    """Runs one stage, keeping its console output quiet, and records how long it took
+
+    :param results: list the timing is added to
+    :param company: company being benchmarked
+    :param rows: number of rows in the insight file
+    :param stage: name of the stage
+    :param fn: function running the stage
+    :return: whatever the stage returned
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        returned = fn(*args)
+        seconds = time.perf_counter() - start_time
+
+    results.append({'company': company.name, 'rows': rows, 'stage': stage, 'seconds': round(seconds, 4),
+                    'rows_per_second': round(rows / seconds) if seconds else None})
+    print("> " + company.name + " " + str(rows) + " rows, " + stage + ": " + str(round(seconds, 3)) + "s")
+
+    return returned
+
+
+def writeStandardFile(filename, std_df, results, company, rows):
+    """Saves the standardized file the way Clean does, timing the
+    xlsx write and the formatting separately
+
+    :param filename: name for the standardized file
+    :param std_df: standardized data frame
+    :param results: list the timings are added to
+    :param company: company being benchmarked
+    :param rows: number of rows in the insight file
+    """
+
+    writer = timeStage(results, company, rows, "xlsx_write", ExcelUtilities.createExcelFile, filename, std_df)
+    timeStage(results, company, rows, "format_sheet", ExcelUtilities.formatSheet, std_df, writer)
+    timeStage(results, company, rows, "xlsx_save", writer.close)
+
+
+def benchmarkCompany(work_dir, company, rows, customers, seed=0):
+    """Times every stage of Clean, then Split and Compile, on one synthetic insight file
+
+    :param work_dir: folder holding the synthetic lookup, insight and output files
+    :param company: company the insight file pretends to come from
+    :param rows: number of rows in the insight file
+    :param customers: number of distinct customers
+    :param seed: random seed
+    :return: list of stage timings
+    """
+
+    results = []
+
+    # Generating the input isn't timed
+    filepath = os.path.join(work_dir, company.name + " " + str(rows) + " Insight.xlsx")
+    ins_df, colors = makeInsightData(company, rows, customers, seed)
+    writeInsightFile(filepath, ins_df, colors)
+
+    # Start from a fresh lookup cache every time
+    shutil.rmtree(ExcelUtilities.cache_dir, ignore_errors=True)
+    lookups = timeStage(results, company, rows, "load_lookups", LookupTables.load, company)
+
+    if company == EnumTypes.Company.ABR:
+        ins_df, abr_colors = timeStage(results, company, rows, "read_insight", GetAbraconFlags.readReport, filepath)
+    else:
+        ins_df = timeStage(results, company, rows, "read_insight", ExcelUtilities.readDataFile, filepath).fillna("")
+
+    std_df = timeStage(results, company, rows, "standardize_columns", StandardizeColumns.main,
+                       ins_df, company, lookups)
+    if company == EnumTypes.Company.DGK:
+        std_df = timeStage(results, company, rows, "fill_end_products", FillEndProducts.main, std_df, lookups)
+    if company == EnumTypes.Company.ABR:
+        std_df = timeStage(results, company, rows, "abracon_flags", GetAbraconFlags.main, std_df, abr_colors)
+    std_df = timeStage(results, company, rows, "assign_sales_reps", AssignSalesReps.main, std_df, lookups)
+
+    std_filename = os.path.splitext(os.path.basename(filepath))[0] + " (Standardized).xlsx"
+    writeStandardFile(std_filename, std_df, results, company, rows)
+
+    # Split the standardized file, then compile the rep files back together
+    std_filepath = ExcelUtilities.output_dir + std_filename
+    timeStage(results, company, rows, "split", Split.main, std_filepath)
+    rep_filepaths = sorted(glob.glob(glob.escape(ExcelUtilities.output_dir) + "[[]*] " + glob.escape(std_filename)))
+    timeStage(results, company, rows, "compile", Compile.main, rep_filepaths)
+
+    return results
+
+
+def gitRevision():
+    """Identifies the version of the code being benchmarked
+
+    :return: current git commit, or None outside a git checkout
+    """
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compareRuns(baseline, run):
+    """Prints how each stage's time changed since a previous benchmark run
+
+    :param baseline: results of the previous run (loaded from its JSON file)
+    :param run: results of this run
+    """
+
+    baseline_times = {(result['company'], result['rows'], result['stage']): result['seconds']
+                      for result in baseline['results']}
+
+    print("> Compared with " + str(baseline.get('revision')) + ":")
+    for result in run['results']:
+        old_seconds = baseline_times.get((result['company'], result['rows'], result['stage']))
+        if not old_seconds or not result['seconds']:
+            continue
+        ratio = result['seconds'] / old_seconds
+        marker = ".." if ratio > 1.1 else "> "  # Flag anything more than 10% slower
+        print(marker + result['company'] + " " + str(result['rows']) + " rows, " + result['stage'] + ": " +
+              str(round(ratio, 2)) + "x (" + str(old_seconds) + "s -> " + str(result['seconds']) + "s)")
+
+
+def main(sizes=None, companies=None, customers=5000, seed=0, out_path="benchmark.json", baseline_path=None,
+         work_dir=None):
+    """Benchmarks Clean (stage by stage), Split and Compile on synthetic data
+
+    :param sizes: insight file row counts to benchmark (DEFAULT_SIZES if None)
+    :param companies: companies to benchmark (DGK, MOU and ABR if None)
+    :param customers: number of distinct customers in the synthetic data
+    :param seed: random seed, so runs on different versions see the same data
+    :param out_path: JSON file the results are written to
+    :param baseline_path: JSON file of an earlier run to compare against
+    :param work_dir: folder for the synthetic files (temporary, removed afterwards, if None)
+    :return: benchmark run, as written to out_path
+    """
+
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+    if companies is None:
+        companies = [EnumTypes.Company.DGK, EnumTypes.Company.MOU, EnumTypes.Company.ABR]
+
+    remove_work_dir = work_dir is None
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="automate-excel-benchmark-")
+
+    # Point every lookup, cache and output path at the synthetic files
+    ExcelUtilities.lookup_dir = os.path.join(work_dir, "Lookup", "")
+    ExcelUtilities.output_dir = os.path.join(work_dir, "Output", "")
+    ExcelUtilities.cache_dir = os.path.join(work_dir, "cache")
+    os.makedirs(ExcelUtilities.output_dir, exist_ok=True)  # Also makes work_dir
+
+    run = {'revision': gitRevision(),
+           'started': datetime.datetime.now().isoformat(timespec="seconds"),
+           'python': platform.python_version(),
+           'pandas': pd.__version__,
+           'numpy': np.__version__,
+           'platform': platform.platform(),
+           'customers': customers,
+           'seed': seed,
+           'results': []}
+
+    try:
+        makeLookupFiles(ExcelUtilities.lookup_dir, customers, seed)
+        for rows in sizes:
+            for company in companies:
+                run['results'] += benchmarkCompany(work_dir, company, rows, customers, seed)
+    finally:
+        if remove_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(out_path, 'w') as out_file:
+        json.dump(run, out_file, indent=2)
+    print("> Benchmark results saved at: " + out_path)
+
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            compareRuns(json.load(baseline_file), run)
+
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Clean, Split and Compile on synthetic insight files")
+    parser.add_argument("--rows", type=int, nargs="+", help="insight file row counts (default: 1000 10000 100000)")
+    parser.add_argument("--company", nargs="+", choices=["DGK", "MOU", "ABR"], help="companies (default: all three)")
+    parser.add_argument("--customers", type=int, default=5000, help="distinct customers in the synthetic data")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    parser.add_argument("--out", default="benchmark.json", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--work-dir", help="keep the synthetic files in this folder")
+    args = parser.parse_args()
+
+    main(args.rows, [EnumTypes.Company[company] for company in args.company] if args.company else None,
+         args.customers, args.seed, args.out, args.baseline, args.work_dir)
@@ -1,5 +1,11 @@
+import contextlib
+import glob
+import hashlib
+import io
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
 
 import AssignSalesReps
@@ -7,58 +13,328 @@ import EnumTypes
 import ExcelUtilities
 import FillEndProducts
 import GetAbraconFlags
+import LookupTables
+import RunReport
 import StandardizeColumns
 
 
-def main(filepath, company):
+# Lookup tables shared by every file a worker process cleans, set once by initWorker
+_worker_lookups = None
+
+# Insight files whose cleaned rows are kept for incremental Cleans of files with the same
+# columns; the least recently cleaned are dropped beyond this
+row_cache_files = 20
+
+
+def main(filepath, company, lookups=None, stream=None, incremental=False):
     """Standardizes columns, gets proper customers, and
     most importantly, assigns sales reps for each order
     in the insight file; to be sent out to sales reps
 
     :param filepath: path to insight file
     :param company: company that provided the insight file
-    :return: export new, cleaned-up insight file
+    :param lookups: lookup tables shared by the batch (loaded here if None)
+    :param stream: stream the Excel output file to disk (only for large files if None)
+    :param incremental: reuse the rows cleaned last time and only clean new or changed rows
+    :return: whether the new, cleaned-up insight file was exported
     """
 
+    # Time each stage for the console and the run report
+    report = RunReport.RunReport("Clean", [filepath])
+
+    # -------------------
+    #  Load lookup files
+    # -------------------
+
+    if lookups is None:
+        with report.stage("load_lookups"):
+            lookups = LookupTables.load(company)
+        if lookups is None:
+            report.stopTracing()
+            return False
+
     # -----------------------
     #  Load insight file
     # -----------------------
 
-    # Load the insight file to a data frame
-    ins_df = pd.read_excel(filepath, sheet_name=0).fillna("")
+    # Load the insight file to a data frame (Abracon color-coding is picked up in the same read)
+    with report.stage("read_insight") as stage:
+        if company == EnumTypes.Company.ABR and filepath.lower().endswith(".xlsx"):
+            ins_df, abr_colors = GetAbraconFlags.readReport(filepath)
+        else:
+            ins_df = ExcelUtilities.readDataFile(filepath).fillna("")
+            # Only Excel files carry color-coding
+            abr_colors = []
+        stage['rows'] = ins_df.shape[0]
 
     # ----------------------
     #  Create standard file
     # ----------------------
 
+    if incremental:
+        std_df = cleanChangedRows(filepath, ins_df, company, lookups, abr_colors, report)
+    else:
+        std_df = cleanRows(ins_df, company, lookups, abr_colors, report)
+
+    # ----------------------
+    #  Export standard file
+    # ----------------------
+
+    # Strip root and extension off filepath and leave just the filename for output
+    filename = os.path.splitext(os.path.basename(filepath))[0] + " (Standardized).xlsx"
+
+    # Create, format and save the file in each output format
+    saved = ExcelUtilities.writeOutputFiles(filename, std_df, stream, report)
+    report.save(RunReport.reportPath(ExcelUtilities.output_dir, filename), ExcelUtilities.outputFilenames(filename))
+    if not saved:
+        return False
+
+    # Success message
+    print("> File successfully standardized!\n"
+          "*Program Complete*")
+
+    return True
+
+
+def cleanRows(ins_df, company, lookups, abr_colors, report=None):
+    """Runs insight rows through every stage that standardizes
+    them and assigns their sales reps
+
+    :param ins_df: insight rows
+    :param company: company that provided the insight file
+    :param lookups: lookup tables
+    :param abr_colors: Abracon color-coding, one per row
+    :param report: run report to time the stages in (or None)
+    :return: dataframe with standardized, rep-assigned rows
+    """
+
+    rows = ins_df.shape[0]
+
     # Standardize columns
-    std_df = StandardizeColumns.main(ins_df, company)
+    with RunReport.stage(report, "standardize_columns", rows):
+        std_df = StandardizeColumns.main(ins_df, company, lookups)
 
     # For Digi-Key, fill in end product
     if company == EnumTypes.Company.DGK:
-        std_df = FillEndProducts.main(std_df)
+        with RunReport.stage(report, "fill_end_products", rows):
+            std_df = FillEndProducts.main(std_df, lookups)
 
     # For Abracon, set flags based on color-coding
     if company == EnumTypes.Company.ABR:
-        std_df = GetAbraconFlags.main(std_df, filepath)
+        with RunReport.stage(report, "abracon_flags", rows):
+            std_df = GetAbraconFlags.main(std_df, abr_colors)
 
     # Assign sales reps
-    std_df = AssignSalesReps.main(std_df)
+    with RunReport.stage(report, "assign_sales_reps", rows):
+        std_df = AssignSalesReps.main(std_df, lookups)
 
-    # ----------------------
-    #  Export standard file
-    # ----------------------
+    return std_df
 
-    # Strip root off filepath and leave just the filename for output
-    filename = os.path.basename(filepath)[:-5] + " (Standardized).xlsx"
 
-    # Create file
-    writer = ExcelUtilities.createExcelFile(filename, std_df)
-    # Format columns in Excel
-    ExcelUtilities.formatSheet(std_df, writer)
-    # Save the file
-    writer.save()
+# ------------------
+#  Incremental mode
+# ------------------
 
-    # Success message
-    print("> File successfully standardized!\n"
-          "*Program Complete*")
+def rowFingerprints(ins_df, abr_colors=None):
+    """Identifies each insight row by its contents, so a row
+    can be recognized again in a revised insight file
+
+    :param ins_df: insight rows
+    :param abr_colors: Abracon color-coding, one per row (None if it doesn't apply)
+    :return: array with one 64-bit hash per row
+    """
+
+    fingerprints = pd.util.hash_pandas_object(ins_df, index=False).values
+    if abr_colors is not None:
+        # Recoloring a row changes its flag, so it counts as a changed row
+        color_hashes = pd.util.hash_array(np.array(abr_colors, dtype=object).astype(str))
+        fingerprints = fingerprints * np.uint64(31) + color_hashes
+    return fingerprints
+
+
+def rowCacheKey(company, ins_cols):
+    """Identifies the insight files whose cleaned rows can be reused for each other
+
+    :param company: company that provided the insight file
+    :param ins_cols: column names of the insight file
+    :return: key shared by every insight file from this company with these columns
+    """
+
+    return hashlib.md5(repr((company.name, ins_cols)).encode()).hexdigest()
+
+
+def rowCachePath(row_cache_key, filepath):
+    """Names the cache file holding one insight file's cleaned rows; each file
+    gets its own, so files cleaned at the same time never write the same one
+
+    :param row_cache_key: key from rowCacheKey
+    :param filepath: path to insight file
+    :return: path to the cache file
+    """
+
+    file_key = hashlib.md5(os.path.splitext(os.path.basename(filepath))[0].lower().encode()).hexdigest()
+    return os.path.join(ExcelUtilities.cache_dir, "rows-" + row_cache_key + "-" + file_key + ".pkl")
+
+
+def rowCachePaths(row_cache_key):
+    """Finds the cache files of every insight file with the same key
+
+    :param row_cache_key: key from rowCacheKey
+    :return: paths to the cache files, most recently saved first
+    """
+
+    saved = []
+    pattern = os.path.join(glob.escape(ExcelUtilities.cache_dir), "rows-" + row_cache_key + "-*.pkl")
+    for cache_path in glob.glob(pattern):
+        try:
+            saved.append((os.path.getmtime(cache_path), cache_path))
+        except OSError:  # Dropped by another Clean in the meantime
+            pass
+
+    return [cache_path for _, cache_path in sorted(saved, reverse=True)]
+
+
+def cleanChangedRows(filepath, ins_df, company, lookups, abr_colors, report=None):
+    """Cleans only the insight rows that weren't in any of the last files cleaned
+    with the same columns, reusing the standardized, rep-assigned result for the
+    rest; nothing is reused once any lookup table has changed
+
+    :param filepath: path to insight file
+    :param ins_df: insight rows
+    :param company: company that provided the insight file
+    :param lookups: lookup tables
+    :param abr_colors: Abracon color-coding, one per row
+    :param report: run report to time the stages in (or None)
+    :return: dataframe with standardized, rep-assigned rows
+    """
+
+    # Abracon color-coding may stop short of the last rows
+    if company == EnumTypes.Company.ABR:
+        abr_colors = (list(abr_colors) + [""] * ins_df.shape[0])[:ins_df.shape[0]]
+
+    ins_cols = [str(col) for col in ins_df.columns]
+    row_cache_key = rowCacheKey(company, ins_cols)
+    cache_fingerprint = (company.name, ins_cols, lookups.fingerprint)
+
+    with RunReport.stage(report, "match_cached_rows", ins_df.shape[0]):
+        fingerprints = rowFingerprints(ins_df, abr_colors if company == EnumTypes.Company.ABR else None)
+
+        # Every row seen in the recent files, the newest copy of a row winning
+        cached_files = [ExcelUtilities.readCacheFile(cache_path, cache_fingerprint)
+                        for cache_path in rowCachePaths(row_cache_key)[:row_cache_files]]
+        cached_files = [cached_rows for cached_rows in cached_files if cached_rows is not None]
+        if cached_files:
+            cached_rows = pd.concat(cached_files)
+            cached_rows = cached_rows[~cached_rows.index.duplicated()]
+        else:
+            cached_rows = pd.DataFrame()
+        seen = np.isin(fingerprints, cached_rows.index.values)
+
+    changed = ~seen
+    print("> Reusing " + str(int(seen.sum())) + " rows from earlier Cleans, cleaning " + str(int(changed.sum())) +
+          " new or changed rows")
+
+    # Reused rows keep their place in the insight file
+    cleaned = []
+    if seen.any():
+        cleaned.append(cached_rows.loc[fingerprints[seen]].set_axis(ins_df.index[seen], axis=0))
+    if changed.any() or not seen.any():
+        changed_colors = [color for color, is_changed in zip(abr_colors, changed) if is_changed]
+        cleaned.append(cleanRows(ins_df[changed], company, lookups, changed_colors, report))
+    std_df = pd.concat(cleaned).sort_index(kind="stable")
+
+    with RunReport.stage(report, "save_row_cache", std_df.shape[0]):
+        row_fingerprints = pd.Series(fingerprints, index=ins_df.index).loc[std_df.index].values
+        row_cache = std_df.set_axis(row_fingerprints, axis=0)
+        row_cache = row_cache[~row_cache.index.duplicated()]
+        ExcelUtilities.writeCacheFile(rowCachePath(row_cache_key, filepath), cache_fingerprint, row_cache,
+                                      "the cleaned rows")
+
+        # Only the most recent files are kept, so the cache stays a few insight files in size
+        for cache_path in rowCachePaths(row_cache_key)[row_cache_files:]:
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    return std_df
+
+
+def initWorker(lookups, output_dir, output_formats):
+    """Stores the batch's lookup tables in a Clean worker process,
+    so they are sent to each process once rather than with every file
+
+    :param lookups: lookup tables shared by the batch
+    :param output_dir: where output files are saved (may be changed from the default)
+    :param output_formats: formats output files are saved in
+    """
+
+    global _worker_lookups
+    _worker_lookups = lookups
+
+    # Freshly started processes only see the defaults
+    ExcelUtilities.output_dir = output_dir
+    ExcelUtilities.output_formats = output_formats
+
+
+def cleanInWorker(filepath, company, stream=None, incremental=False):
+    """Cleans one insight file inside a worker process
+
+    :param filepath: path to insight file
+    :param company: company that provided the insight file
+    :param stream: stream the Excel output file to disk (only for large files if None)
+    :param incremental: only clean new or changed rows
+    :return: console output, whether it was cleaned, error message (None if nothing went wrong)
+    """
+
+    output = io.StringIO()
+    cleaned = False
+    error = None
+    with contextlib.redirect_stdout(output):
+        try:
+            cleaned = main(filepath, company, _worker_lookups, stream, incremental)
+        except Exception as worker_error:
+            error = str(worker_error)
+
+    return output.getvalue(), cleaned, error
+
+
+def mainParallel(filepaths, company, lookups, max_workers=None, stream=None, incremental=False):
+    """Cleans several insight files at once across a pool of processes;
+    each file's console output is reported in the order it was selected
+
+    :param filepaths: paths to insight files
+    :param company: company that provided the insight files
+    :param lookups: lookup tables shared by the batch
+    :param max_workers: number of processes (one per CPU if None)
+    :param stream: stream each Excel output file to disk (only for large files if None)
+    :param incremental: only clean new or changed rows of each file
+    :return: whether every insight file was cleaned
+    """
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(filepaths)))
+
+    print("> Cleaning " + str(len(filepaths)) + " files across " + str(max_workers) + " processes..")
+
+    worker_args = (lookups, ExcelUtilities.output_dir, ExcelUtilities.output_formats)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initWorker, initargs=worker_args) as executor:
+        futures = [executor.submit(cleanInWorker, filepath, company, stream, incremental) for filepath in filepaths]
+
+        all_cleaned = True
+        for filepath, future in zip(filepaths, futures):
+            try:
+                output, cleaned, error = future.result()
+            except Exception as pool_error:  # Worker process died
+                output, cleaned, error = "", False, str(pool_error)
+            all_cleaned = all_cleaned and cleaned
+
+            # One file failing doesn't stop the rest of the batch
+            print("> " + os.path.basename(filepath) + ":\n" + output, end="")
+            if error:
+                print("..Unexpected Python error:\n" +
+                      "?" + error + "\n" +
+                      "..Please contact your local coder.")
+
+    return all_cleaned
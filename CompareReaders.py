@@ -0,0 +1,72 @@
+import argparse
+import os
+import time
+
+import ExcelUtilities
+
+
+def timeReader(filepath, engine, repeat):
+    """Parses one file with one reader backend several times over
+
+    :param filepath: path to the Excel file
+    :param engine: reader backend to time
+    :param repeat: number of times to parse the file
+    :return: fastest parse time in seconds, dataframe from the last parse
+    """
+
+    best_time = None
+    sheet_data = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        sheet_data = ExcelUtilities.readExcel(filepath, engine=engine)
+        elapsed = time.perf_counter() - start_time
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+
+    return best_time, sheet_data
+
+
+def main(filepaths, engines=None, repeat=3):
+    """Times every reader backend on each file, so the fastest one
+    can be put first in ExcelUtilities.reader_engines
+
+    :param filepaths: paths to Excel files shaped like our real reports
+    :param engines: reader backends to compare (ExcelUtilities.reader_engines if None)
+    :param repeat: number of times to parse each file (the fastest run counts)
+    """
+
+    if engines is None:
+        engines = ExcelUtilities.reader_engines
+
+    for filepath in filepaths:
+        print("> " + os.path.basename(filepath) + ":")
+        baseline = None
+        for engine in engines:
+            try:
+                best_time, sheet_data = timeReader(filepath, engine, repeat)
+            except Exception as error:
+                print("..  " + engine + ": unable to read (" + str(error) + ")")
+                continue
+
+            # Every backend should hand back the same data as the first one
+            if baseline is None:
+                baseline = sheet_data
+                same_data = "baseline"
+            elif sheet_data.fillna("").astype(str).equals(baseline.fillna("").astype(str)):
+                same_data = "same data"
+            else:
+                same_data = "DIFFERENT DATA"
+
+            rows, cols = sheet_data.shape
+            print(">   " + engine + ": " + str(round(best_time, 3)) + "s for " + str(rows) + " rows x " +
+                  str(cols) + " cols (" + str(int(rows / best_time)) + " rows/s, " + same_data + ")")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare parse time of each Excel reader backend")
+    parser.add_argument("filepaths", nargs="+", help="insight, standardized or lookup files to parse")
+    parser.add_argument("--engines", nargs="+", help="reader backends to compare (default: all configured)")
+    parser.add_argument("--repeat", type=int, default=3, help="times to parse each file (fastest counts)")
+    args = parser.parse_args()
+
+    main(args.filepaths, args.engines, args.repeat)
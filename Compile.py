@@ -1,59 +1,105 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 from xlrd import XLRDError
 
 import ExcelUtilities
+import RunReport
 
 
-def main(filepaths):
-    """Stitches together Excel files, ensuring consistent columns
+def readFeedbackFile(filepath, nrows=None):
+    """Parses one feedback file (run in a worker process)
+
+    :param filepath: path to the feedback file
+    :param nrows: number of rows to read (all if None, just the header if 0)
+    :return: data frame for the feedback file
+    """
+
+    return ExcelUtilities.readDataFile(filepath, nrows=nrows)
+
+
+def readFeedbackFiles(filepaths, nrows=None, max_workers=None):
+    """Parses feedback files in parallel, handing them back in order
+    as soon as each one is ready; files not yet started are cancelled
+    if the caller stops early
 
     :param filepaths: list of paths to each sales rep's feedback file
-    :return: single, compiled feedback report
+    :param nrows: number of rows to read from each file (all if None)
+    :param max_workers: number of processes (one per CPU if None)
+    :return: generator of data frames, in the same order as filepaths
     """
 
-    # ------------------------
-    # Load the feedback files
-    # ------------------------
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(filepaths)))
 
-    try:
-        fdbk_file_dfs = [pd.read_excel(filepath, sheet_name=0) for filepath in filepaths]
-    except XLRDError:
-        print('..Error reading in files!\n'
-              '*Program Terminated*')
-        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(readFeedbackFile, filepath, nrows) for filepath in filepaths]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def headerMismatch(header, fdbk_file_df):
+    """Checks a feedback file's columns against the first file's
 
-    # ------------------
-    #  Create dataframe
-    # ------------------
+    :param header: columns of the first feedback file
+    :param fdbk_file_df: data frame (or just the header) of a feedback file
+    :return: whether the columns differ
+    """
+
+    # Make sure they have the same number of columns as the original file
+    if len(fdbk_file_df.columns) != len(header):
+        return True
+
+    # Make sure each column matches
+    for i in range(len(fdbk_file_df.columns)):
+        if fdbk_file_df.columns[i] != header[i]:
+            return True
 
-    header = fdbk_file_dfs[0].columns  # First file determines columns
-    cmp_df = pd.DataFrame(columns=header).fillna("")
+    return False
 
-    # -----------------------
-    #  Stitch files together
-    # -----------------------
 
-    file_number = 1
-    for fdbk_file_df in fdbk_file_dfs:
-        # Make sure they have the same number of columns as the original file
-        if len(fdbk_file_df.columns) != len(header):
-            print("..Column mismatch between files 1 and " + str(file_number) + ".\n" +
-                  "*Program Terminated*")
-            return
+def main(filepaths, stream=False):
+    """Stitches together Excel files, ensuring consistent columns
+
+    :param filepaths: list of paths to each sales rep's feedback file
+    :param stream: write each file's rows straight to the compiled report
+                   instead of holding every file in memory at once
+    :return: whether the single, compiled feedback report was exported
+    """
 
-        # Make sure each column matches
-        for i in range(len(fdbk_file_df.columns)):
-            if fdbk_file_df.columns[i] != cmp_df.columns[i]:
-                print("..Column mismatch between files 1 and " + str(file_number) + ".\n" +
-                      "*Program Terminated*")
-                return
+    # Time each stage for the console and the run report
+    run_report = RunReport.RunReport("Compile", filepaths)
 
-        # Append this dataframe to the compiled dataframe
-        cmp_df = cmp_df.append(fdbk_file_df, ignore_index=True)
+    # --------------------------------------------
+    #  Load the feedback files and check headers
+    # --------------------------------------------
 
-        file_number += 1
+    fdbk_file_dfs = []
+    try:
+        # Stream mode only needs the headers for now; rows are read one file at a time while writing
+        # Each file is checked as soon as it arrives, so a mismatch stops the job early
+        with run_report.stage("read_headers" if stream else "read_files") as stage:
+            for fdbk_file_df in readFeedbackFiles(filepaths, nrows=0 if stream else None):
+                fdbk_file_dfs.append(fdbk_file_df)
+                header = fdbk_file_dfs[0].columns  # First file determines columns
+
+                if headerMismatch(header, fdbk_file_df):
+                    print("..Column mismatch between files 1 and " + str(len(fdbk_file_dfs)) + ".\n" +
+                          "*Program Terminated*")
+                    run_report.stopTracing()
+                    return False
+            stage['rows'] = sum(fdbk_file_df.shape[0] for fdbk_file_df in fdbk_file_dfs)
+    except XLRDError:
+        print('..Error reading in files!\n'
+              '*Program Terminated*')
+        run_report.stopTracing()
+        return False
 
     # ----------------------
     #  Export Compiled file
@@ -65,7 +111,7 @@ def main(filepaths):
     # Remove [OSR]
     if "]" in report_name:
         report_name = report_name[report_name.index("]"):]
-    # Remove (Standardized) and .xlsx
+    # Remove (Standardized) and the extension
     if "(" in report_name:
         report_name = report_name[:report_name.index("(")]
     elif "." in report_name:
@@ -75,12 +121,49 @@ def main(filepaths):
     # Add finishing touches
     filename = report_name.strip() + " (Compiled).xlsx"
 
-    # Create the file
-    writer = ExcelUtilities.createExcelFile(filename, cmp_df)
-    # Format the file
-    ExcelUtilities.formatSheet(cmp_df, writer)
-    # Save the file
-    writer.save()
+    if stream:
+        # Append each file's rows to the report (in each output format) as soon as it is read
+        stream_writers = []
+        for out_filename in ExcelUtilities.outputFilenames(filename):
+            stream_writer = ExcelUtilities.createStreamFile(out_filename, header)
+            if stream_writer is None:
+                run_report.stopTracing()
+                return False
+            stream_writers.append(stream_writer)
+        with run_report.stage("stream_files") as stage:
+            stage['rows'] = 0
+            try:
+                for filepath in filepaths:
+                    fdbk_file_df = ExcelUtilities.readDataFile(filepath)
+                    for stream_writer in stream_writers:
+                        stream_writer.writeRows(fdbk_file_df)
+                    stage['rows'] += fdbk_file_df.shape[0]
+                for stream_writer in stream_writers:
+                    stream_writer.close()
+            except Exception:
+                # Don't leave half-written reports behind
+                for stream_writer in stream_writers:
+                    stream_writer.abort()
+                run_report.stopTracing()
+                raise
+        for stream_writer in stream_writers:
+            print("> New file saved at: " + stream_writer.out_path)
+        saved = True
+    else:
+        # Stitch files together in one go
+        with run_report.stage("concat") as stage:
+            cmp_df = pd.concat(fdbk_file_dfs, ignore_index=True)
+            stage['rows'] = cmp_df.shape[0]
+
+        # Create, format and save the file in each output format
+        saved = ExcelUtilities.writeOutputFiles(filename, cmp_df, report=run_report)
+
+    run_report.save(RunReport.reportPath(ExcelUtilities.output_dir, filename),
+                    ExcelUtilities.outputFilenames(filename))
+    if not saved:
+        return False
 
     print("> Files successfully compiled!\n"
           "*Program Complete*")
+
+    return True
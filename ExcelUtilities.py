@@ -1,14 +1,42 @@
+import contextlib
+import datetime
+import hashlib
 import os
+import pickle
+import time
 
 import numpy as np
 import pandas as pd
+import xlsxwriter
 from xlrd import XLRDError
 
 import EnumTypes
+import RunReport
 
 
 default_sheet_name = "Data"
 
+# Where the shared lookup files live
+lookup_dir = "W:/Lookup/"
+# Where output files are saved
+output_dir = "W:/Output/"
+# Formats every output file is saved in: the formatted "xlsx" report,
+# and/or plain "csv"/"parquet" data for scripts further down the line
+output_formats = ["xlsx"]
+# Where parsed lookup sheets are cached locally between runs
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+# Output files with at least this many rows are streamed to disk rather than built in memory
+stream_min_rows = 200000
+# Rows handed to the stream writer at a time
+stream_chunk_rows = 50000
+# Reader backends to try, fastest first; each later one is the fallback for the ones before it
+reader_engines = ["calamine", "openpyxl"]
+# File types a reader backend can open, for backends that can't open every Excel file
+engine_file_types = {"openpyxl": (".xlsx", ".xlsm", ".xltx", ".xltm")}
+
+# Reader backends found not to be installed, skipped for the rest of the run
+_missing_engines = set()
+
 
 def saveError(*excel_files):
     """Checks for obstacles with saving the output file
@@ -35,8 +63,7 @@ def createExcelFile(filename, sheet_data):
     """
 
     # Verify output path
-    out_dir = "W:/Output/"
-    out_path = out_dir + filename
+    out_path = output_dir + filename
     if saveError(out_path):
         print("..One or more files are currently open in Excel!\n"
               "..Please close the files and try again.\n"
@@ -52,26 +79,263 @@ def createExcelFile(filename, sheet_data):
     return writer
 
 
-def loadLookupFile(filename, sheet_name):
-    """Loads the specified sheet from the lookup file to a dataframe
+def readExcel(filepath, sheet_name=0, usecols=None, nrows=None, engine=None):
+    """Reads one sheet of an Excel file to a dataframe with the fastest
+    reader backend available, falling back to the next one on failure
+
+    :param filepath: path to the Excel file
+    :param sheet_name: name or position of the sheet to read
+    :param usecols: names of the only columns we need (all columns if None)
+    :param nrows: number of rows to read (all if None, just the header if 0)
+    :param engine: only use this reader backend (reader_engines in order if None)
+    :return: dataframe with sheet data
+    """
+
+    # Pandas' own pick for the file type is always the last resort (e.g. xlrd for .xls)
+    if engine:
+        engines = [engine]
+    else:
+        extension = os.path.splitext(str(filepath))[1].lower()
+        engines = [backend for backend in reader_engines if backend not in _missing_engines and
+                   extension in engine_file_types.get(backend, (extension,))] + [None]
+
+    for engine in engines:
+        try:
+            return pd.read_excel(filepath, sheet_name, usecols=usecols, nrows=nrows, engine=engine)
+        except (ImportError, ValueError) as error:
+            # Not installed, or too new for this pandas; anything else is a problem with
+            # the file itself, which the other backends won't read either
+            if isinstance(error, ValueError) and not str(error).startswith("Unknown engine"):
+                raise
+            if engine == engines[-1]:
+                raise
+            # Skip this backend for the rest of the run
+            _missing_engines.add(engine)
+
+
+def readCsv(filepath, usecols=None, nrows=None):
+    """Reads a CSV file the way its values would sit in an Excel sheet: a column
+    of numbers becomes numeric, but a column with any leading zeros (zip codes,
+    customer classes) or non-numbers stays text, and blanks are left blank
+
+    :param filepath: path to the CSV file
+    :param usecols: names of the only columns we need (all columns if None)
+    :param nrows: number of rows to read (all if None, just the header if 0)
+    :return: dataframe with file data
+    """
+
+    file_data = pd.read_csv(filepath, usecols=usecols, nrows=nrows, dtype=str, keep_default_na=False)
+
+    for col in file_data.columns:
+        values = file_data[col].str.strip()
+        numbers = pd.to_numeric(values.where(values != ""), errors='coerce')
+        all_numbers = numbers.notna().sum() == (values != "").sum()
+        if all_numbers and not values.str.match(r"[+-]?0\d").any():
+            file_data[col] = numbers
+
+    return file_data
+
+
+def readDataFile(filepath, usecols=None, nrows=None):
+    """Reads an insight, standardized or feedback file to a dataframe,
+    picking the reader from the file extension (CSV, Parquet or Excel)
+
+    :param filepath: path to the file
+    :param usecols: names of the only columns we need (all columns if None)
+    :param nrows: number of rows to read (all if None, just the header if 0)
+    :return: dataframe with file data
+    """
+
+    extension = os.path.splitext(filepath)[1].lower()
+
+    if extension == ".csv":
+        return readCsv(filepath, usecols=usecols, nrows=nrows)
+    if extension == ".parquet":
+        file_data = pd.read_parquet(filepath, columns=usecols)
+        return file_data if nrows is None else file_data.head(nrows)
+
+    return readExcel(filepath, usecols=usecols, nrows=nrows)
+
+
+def parquetColumns(sheet_data):
+    """Settles the type of columns that mix values, which Parquet can't store;
+    numbers with blanks in between stay numbers, anything else becomes text
+    (numbers stored as text, like "01234", stay text so leading zeros survive)
+
+    :param sheet_data: dataframe to be saved as Parquet
+    :return: dataframe with a single type per column
+    """
+
+    sheet_data = sheet_data.copy()
+    for col in sheet_data.columns:
+        values = sheet_data[col]
+        if not pd.api.types.infer_dtype(values, skipna=True).startswith("mixed"):
+            continue
+
+        blank = values.isna() | (values == "")
+        all_numbers = all(isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+                          for value in values[~blank])
+        if all_numbers:
+            sheet_data[col] = pd.to_numeric(values.where(~blank))
+        else:
+            sheet_data[col] = values.where(values.isna(), values.astype(str))
+
+    return sheet_data
+
+
+def writeDataFile(filename, sheet_data, report=None):
+    """Saves a dataframe as a plain CSV or Parquet file (no formatting),
+    picking the format from the file extension
+
+    :param filename: name for our created file
+    :param sheet_data: dataframe which will be copied to this file
+    :param report: run report the write is timed in (if any)
+    :return: whether the file was saved
+    """
+
+    # Verify output path
+    out_path = output_dir + filename
+    if saveError(out_path):
+        print("..One or more files are currently open in Excel!\n"
+              "..Please close the files and try again.\n"
+              "*Program Terminated*")
+        return False
+
+    if filename.lower().endswith(".parquet"):
+        try:
+            with RunReport.stage(report, "parquet_write", sheet_data.shape[0]):
+                parquetColumns(sheet_data).to_parquet(out_path, index=False)
+        except ImportError:
+            print("..Parquet files need pyarrow installed, " + filename + " was not saved.")
+            return False
+    else:
+        with RunReport.stage(report, "csv_write", sheet_data.shape[0]):
+            sheet_data.to_csv(out_path, index=False)
+
+    print("> New file saved at: " + out_path)
+
+    return True
+
+
+def fileFingerprint(filepath):
+    """Identifies the current version of a file without reading it
+
+    :param filepath: path to the file
+    :return: (absolute path, modified time, size)
+    """
+
+    stat = os.stat(filepath)
+    return os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size
+
+
+def readCacheFile(cache_path, fingerprint):
+    """Loads cached data if it was worked out from the same inputs as now
+
+    :param cache_path: path to the cache file
+    :param fingerprint: fingerprint of the inputs the data is worked out from
+    :return: cached data, or None if there is no usable cache
+    """
+
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            cached = pickle.load(cache_file)
+    except Exception:  # Missing, unreadable or written by another pandas version
+        return None
+
+    if cached.get("fingerprint") != fingerprint:
+        return None
+    return cached.get("data")
+
+
+@contextlib.contextmanager
+def cacheFileLock(cache_path, timeout=10):
+    """Lets one process at a time read, update and save a cache file shared
+    by several processes; a lock still held after the timeout is taken to be
+    left over from a crashed process and is taken over
+
+    :param cache_path: path to the cache file
+    :param timeout: seconds to wait for another process to finish
+    """
+
+    lock_path = cache_path + ".lock"
+    lock_file = None
+    try:
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        deadline = time.monotonic() + timeout
+        while lock_file is None:
+            try:
+                lock_file = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    removeFile(lock_path)
+                    deadline = time.monotonic() + timeout
+                else:
+                    time.sleep(0.05)
+    except OSError:  # Can't lock here, so go ahead without it
+        pass
+
+    try:
+        yield
+    finally:
+        if lock_file is not None:
+            os.close(lock_file)
+            removeFile(lock_path)
+
+
+def writeCacheFile(cache_path, fingerprint, data, description):
+    """Saves data so later runs with the same inputs can skip working it out
+
+    :param cache_path: path to the cache file
+    :param fingerprint: fingerprint of the inputs the data was worked out from
+    :param data: data to cache
+    :param description: what is being cached, for the error message
+    """
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to a temporary file first so a half-written cache is never read,
+        # one per process since Clean workers may share a cache file
+        temp_path = cache_path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, 'wb') as cache_file:
+            pickle.dump({"fingerprint": fingerprint, "data": data}, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        print("..Unable to cache " + description + ", it will be worked out again next run.")
+
+
+def loadLookupFile(filename, sheet_name, usecols=None):
+    """Loads the specified sheet from the lookup file to a dataframe,
+    reusing the local cache while the workbook is unchanged
 
     :param: filename: name of the lookup file
     :param: sheet_name: name of the main sheet we pull data from
+    :param: usecols: names of the only columns we need (all columns if None)
     :return: dataframe with sheet data
     """
 
     # Assume file is in the lookup directory
-    look_dir = "W:/Lookup/"
-    filepath = look_dir + filename
+    filepath = lookup_dir + filename
 
     if os.path.exists(filepath):
+        # One cache file per workbook, sheet and column selection
+        cache_key = repr((os.path.abspath(filepath), sheet_name, usecols))
+        cache_path = os.path.join(cache_dir, hashlib.md5(cache_key.encode()).hexdigest() + ".pkl")
+        fingerprint = fileFingerprint(filepath)
+
+        sheet_data = readCacheFile(cache_path, fingerprint)
+        if sheet_data is not None:
+            print("> Lookup cache hit: " + filename)
+            return sheet_data
+
+        print("> Lookup cache miss, parsing: " + filename)
         try:
-            sheet_data = pd.read_excel(filepath, sheet_name).fillna("")
-        except XLRDError:
+            sheet_data = readExcel(filepath, sheet_name, usecols=usecols).fillna("")
+        except (XLRDError, ValueError):
             print("..Error reading sheet name for " + filename + "!\n"
                   "..Please make sure the main tab is named \"" + sheet_name + "\".\n"
                   "*Program Terminated*")
             return
+        writeCacheFile(cache_path, fingerprint, sheet_data, filename)
     else:
         print("..No " + filename + " file found!\n"
               "..Please make sure " + filename + " is in the directory.\n"
@@ -81,6 +345,127 @@ def loadLookupFile(filename, sheet_name):
     return sheet_data
 
 
+# Determine which columns need which format
+accounting_cols = ['Unit Price', 'Invoiced Dollars']
+number_with_commas_cols = ['Quantity']
+definitely_text_cols = ['Customer Class']  # Make sure it's not interpreted as a number
+center_aligned_cols = ['OSR', 'Reported Distributor']
+right_aligned_cols = ['Zip Code', 'Phone']
+
+
+def addFormats(book):
+    """Defines all the different format options we will need
+
+    :param: book: xlsxwriter workbook the formats belong to
+    :return: format name -> xlsxwriter format
+    """
+
+    calibri = {'font': 'Calibri', 'font_size': 11}
+
+    return {'default': book.add_format(dict(calibri)),
+            'center_aligned': book.add_format(dict(calibri, align='center')),
+            'right_aligned': book.add_format(dict(calibri, align='right')),
+            'accounting': book.add_format(dict(calibri, num_format=44)),
+            'number_with_commas': book.add_format(dict(calibri, num_format=3)),
+            'individual': book.add_format(dict(calibri, bg_color='#ccc0da')),
+            'new_account': book.add_format(dict(calibri, bg_color='yellow')),
+            'out_of_territory': book.add_format(dict(calibri, bg_color='#ff5050')),
+            'proper_name_not_associated': book.add_format(dict(calibri, bg_color='#99ff66')),
+            'proper_name_not_found': book.add_format(dict(calibri, bg_color='#66ffff')),
+            'abr_yellow': book.add_format(dict(calibri, bg_color=EnumTypes.AbraconFlags.YELLOW_HEX.value)),
+            'abr_green': book.add_format(dict(calibri, bg_color=EnumTypes.AbraconFlags.GREEN_HEX.value)),
+            'abr_orange': book.add_format(dict(calibri, bg_color=EnumTypes.AbraconFlags.ORANGE_HEX.value))}
+
+
+def columnFormat(col):
+    """Picks the format name for a whole column
+
+    :param: col: column header
+    :return: format name
+    """
+
+    if col in accounting_cols:
+        return 'accounting'
+    elif col in number_with_commas_cols:
+        return 'number_with_commas'
+    elif col in definitely_text_cols:
+        return 'default'
+    elif col in center_aligned_cols:
+        return 'center_aligned'
+    elif col in right_aligned_cols:
+        return 'right_aligned'
+    return 'default'
+
+
+def columnWidth(column, col):
+    """Finds column width by largest item in that column
+
+    :param: column: series of column values
+    :param: col: column header
+    :return: width before the max width is applied
+    """
+
+    # Newer pandas keeps blanks as NaN through astype(str), so convert each value itself
+    return max(column.map(lambda value: len(str(value))).max(), len(col)) + 5
+
+
+def customerFlagCells(sheet_data):
+    """Works out every flagged Reported Customer cell at once
+
+    :param: sheet_data: working data frame for output
+    :return: row positions of flagged cells, their values, their format names
+    """
+
+    # +++ Flags +++
+    # 1) Purple: customer classed as "individual"
+    # 2) Yellow: new account, not found in rootCustomerMappings
+    # 3) Red: out of territory, not found in CAZipCode
+    # 4) Green: account found in rootCustomerMappings, but not assigned a proper name
+
+    flag = sheet_data['Flag']
+    customer_company = sheet_data['Reported Customer']
+    customer_name = sheet_data['Name']
+    no_customer_company = ~customer_company.astype(bool)
+
+    # Order of conditions determines precedence of flags
+    out_of_territory = flag == EnumTypes.Flag.OOT.value
+    fmt_names = np.select(
+        [out_of_territory,  # Out of territory (with or without a customer)
+         flag == EnumTypes.Flag.CNP.value,  # Individual
+         flag == EnumTypes.Flag.CNF.value,  # New account: customer not found in map
+         flag == EnumTypes.Flag.PNA.value,  # Proper name not associated: customer found, no proper name
+         flag == EnumTypes.Flag.PNF.value],  # Proper name in customer-map but not in master acct list
+        ['out_of_territory', 'individual', 'new_account', 'proper_name_not_associated', 'proper_name_not_found'],
+        default="")
+
+    # Individuals (and out of territory individuals) show their name instead
+    use_name = (out_of_territory & no_customer_company) | (flag == EnumTypes.Flag.CNP.value)
+    values = customer_company.where(~use_name, customer_name)
+
+    # NaN values can't be written over the cell, so it is left as is
+    positions = np.flatnonzero(fmt_names != "")
+    values = values.iloc[positions]
+    writable = ~values.map(lambda value: isinstance(value, float) and not np.isfinite(value)).to_numpy(dtype=bool)
+    positions = positions[writable]
+
+    return positions, values[writable].tolist(), fmt_names[positions].tolist()
+
+
+def abraconFlagFormats(abr_flags):
+    """Works out the format name of every Abracon Flag cell at once
+
+    :param: abr_flags: the Abracon Flag column
+    :return: row positions of flagged cells, their format names
+    """
+
+    fmt_names = abr_flags.map({EnumTypes.AbraconFlags.YELLOW_DESC.value: 'abr_yellow',
+                               EnumTypes.AbraconFlags.GREEN_DESC.value: 'abr_green',
+                               EnumTypes.AbraconFlags.ORANGE_DESC.value: 'abr_orange'})
+    positions = np.flatnonzero(fmt_names.notna().to_numpy())
+
+    return positions, fmt_names.iloc[positions].tolist()
+
+
 def formatSheet(sheet_data, writer):
     """Formats our output file to make it look nice :)
 
@@ -102,42 +487,7 @@ def formatSheet(sheet_data, writer):
     sheet.ignore_errors({'number_stored_as_text': 'A1:XFD1048576'})
 
     # Define all the different format options we will need
-    fmt_default = writer.book.add_format({'font': 'Calibri',
-                                          'font_size': 11})
-    fmt_center_aligned = writer.book.add_format({'font': 'Calibri',
-                                                 'font_size': 11,
-                                                 'align': 'center'})
-    fmt_right_aligned = writer.book.add_format({'font': 'Calibri',
-                                                'font_size': 11,
-                                                'align': 'right'})
-    fmt_accounting = writer.book.add_format({'font': 'Calibri',
-                                             'font_size': 11,
-                                             'num_format': 44})
-    fmt_number_with_commas = writer.book.add_format({'font': 'Calibri',
-                                                     'font_size': 11,
-                                                     'num_format': 3})
-    fmt_individual = writer.book.add_format({'font': 'Calibri',
-                                             'font_size': 11,
-                                             'bg_color': '#ccc0da'})
-    fmt_new_account = writer.book.add_format({'font': 'Calibri',
-                                              'font_size': 11,
-                                              'bg_color': 'yellow'})
-    fmt_out_of_territory = writer.book.add_format({'font': 'Calibri',
-                                                   'font_size': 11,
-                                                   'bg_color': '#ff5050'})
-    fmt_proper_name_not_associated = writer.book.add_format({'font': 'Calibri',
-                                                             'font_size': 11,
-                                                             'bg_color': '#99ff66'})
-    fmt_proper_name_not_found = writer.book.add_format({'font': 'Calibri',
-                                                        'font_size': 11,
-                                                        'bg_color': '#66ffff'})
-
-    # Determine which columns need which format
-    accounting_cols = ['Unit Price', 'Invoiced Dollars']
-    number_with_commas_cols = ['Quantity']
-    definitely_text_cols = ['Customer Class']  # Make sure it's not interpreted as a number
-    center_aligned_cols = ['OSR', 'Reported Distributor']
-    right_aligned_cols = ['Zip Code', 'Phone']
+    formats = addFormats(writer.book)
 
     # -------------------------
     #  Format and size columns
@@ -145,20 +495,9 @@ def formatSheet(sheet_data, writer):
 
     for col in sheet_data.columns:
         # Setting each column's style
-        fmt = fmt_default
-        if col in accounting_cols:
-            fmt = fmt_accounting
-        elif col in number_with_commas_cols:
-            fmt = fmt_number_with_commas
-        elif col in definitely_text_cols:
-            fmt = fmt_default
-        elif col in center_aligned_cols:
-            fmt = fmt_center_aligned
-        elif col in right_aligned_cols:
-            fmt = fmt_right_aligned
-
-        # Find column width by largest item in that column
-        col_width = max(sheet_data[col].astype(str).map(len).max(), len(col)) + 5
+        fmt = formats[columnFormat(col)]
+
+        col_width = columnWidth(sheet_data[col], col)
         col_width = min(col_width, 35)  # Max width
         # Set column width and formatting
         col_idx = sheet_data.columns.get_loc(col)
@@ -168,41 +507,12 @@ def formatSheet(sheet_data, writer):
     #  Flag individual cells
     # -----------------------
 
-    # +++ Flags +++
-    # 1) Purple: customer classed as "individual"
-    # 2) Yellow: new account, not found in rootCustomerMappings
-    # 3) Red: out of territory, not found in CAZipCode
-    # 4) Green: account found in rootCustomerMappings, but not assigned a proper name
-
     try:
         customer_col_index = list(sheet_data).index('Reported Customer')
-        row_index = 1
-        for i in sheet_data.index:
-            # Filling customer cell with one of these values
-            customer_name = sheet_data.loc[i, 'Name']
-            customer_company = sheet_data.loc[i, 'Reported Customer']
-            # Read flags to determine format
-            flag = sheet_data.loc[i, 'Flag']
-
-            # Format based on flags
-            # Order of if statements determines precedence of flags
-            try:
-                if flag == EnumTypes.Flag.OOT.value and not customer_company:  # Out of territory + individual
-                    sheet.write(row_index, customer_col_index, customer_name, fmt_out_of_territory)
-                elif flag == EnumTypes.Flag.OOT.value:  # Out of territory
-                    sheet.write(row_index, customer_col_index, customer_company, fmt_out_of_territory)
-                elif flag == EnumTypes.Flag.CNP.value:  # Individual
-                    sheet.write(row_index, customer_col_index, customer_name, fmt_individual)
-                elif flag == EnumTypes.Flag.CNF.value:  # New account: customer not found in map
-                    sheet.write(row_index, customer_col_index, customer_company, fmt_new_account)
-                elif flag == EnumTypes.Flag.PNA.value:  # Proper name not associated: customer found, no proper name
-                    sheet.write(row_index, customer_col_index, customer_company, fmt_proper_name_not_associated)
-                elif flag == EnumTypes.Flag.PNF.value:  # Proper name in customer-map but not in master acct list
-                    sheet.write(row_index, customer_col_index, customer_company, fmt_proper_name_not_found)
-            except:  # Handle NaN values
-                pass
-
-            row_index += 1
+        positions, values, fmt_names = customerFlagCells(sheet_data)
+        # Only flagged cells are rewritten, +1 to skip the header row
+        for position, value, fmt_name in zip(positions, values, fmt_names):
+            sheet.write(position + 1, customer_col_index, value, formats[fmt_name])
     except:
         print("..Unable to format with flags")
 
@@ -211,28 +521,332 @@ def formatSheet(sheet_data, writer):
     # ---------------
 
     if 'Abracon Flag' in sheet_data.columns:
-        fmt_abr_yellow = writer.book.add_format({'font': 'Calibri',
-                                                 'font_size': 11,
-                                                 'bg_color': EnumTypes.AbraconFlags.YELLOW_HEX.value})
-        fmt_abr_green = writer.book.add_format({'font': 'Calibri',
-                                                'font_size': 11,
-                                                'bg_color': EnumTypes.AbraconFlags.GREEN_HEX.value})
-        fmt_abr_orange = writer.book.add_format({'font': 'Calibri',
-                                                 'font_size': 11,
-                                                 'bg_color': EnumTypes.AbraconFlags.ORANGE_HEX.value})
-
-        row_index = 1
         abr_flag_col_index = list(sheet_data).index('Abracon Flag')
+        positions, fmt_names = abraconFlagFormats(sheet_data['Abracon Flag'])
+        abr_flags = sheet_data['Abracon Flag'].iloc[positions].tolist()
+        for position, abr_flag, fmt_name in zip(positions, abr_flags, fmt_names):
+            sheet.write(position + 1, abr_flag_col_index, abr_flag, formats[fmt_name])
+
+
+def isBlank(value):
+    """Checks for values pandas writes as empty cells (None, NaN, NaT)
+
+    :param: value: cell value
+    :return: whether the cell is left empty
+    """
+
+    return value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value))
+
+
+class StreamWriter:
+    """Writes a formatted output file one block of rows at a time, in order,
+    so the whole sheet never has to be held in memory at once"""
+
+    def __init__(self, out_path, header):
+        self.out_path = out_path
+        self.header = list(header)
+        self.rows_written = 0
+
+        # Rows are flushed to disk as soon as the next row is started
+        self.book = xlsxwriter.Workbook(out_path, {'constant_memory': True})
+        self.sheet = self.book.add_worksheet(default_sheet_name)
+        self.formats = addFormats(self.book)
+        self.fmt_header = self.book.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        self.fmt_date = self.book.add_format({'num_format': "yyyy-mm-dd"})
+
+        # Column formats must be in place before rows are flushed; widths are set on close
+        self.col_widths = [len(col) + 5 for col in self.header]
+        for col_idx, col in enumerate(self.header):
+            self.sheet.set_column(col_idx, col_idx, None, self.formats[columnFormat(col)])
+
+        for col_idx, col in enumerate(self.header):
+            self.sheet.write(0, col_idx, col, self.fmt_header)
+
+    def writeRows(self, sheet_data):
+        """Appends a block of rows, highlighting flagged cells as they are written
+
+        :param: sheet_data: data frame with the same columns as the header
+        """
+
+        if sheet_data.shape[0] == 0:
+            return
+
+        for col_idx, col in enumerate(self.header):
+            self.col_widths[col_idx] = max(self.col_widths[col_idx], columnWidth(sheet_data[col], col))
+
+        # Work out this block's highlighted cells up front: position -> (column, value, format)
+        flagged_cells = {}
+        if all(col in self.header for col in ['Reported Customer', 'Name', 'Flag']):
+            customer_col_index = self.header.index('Reported Customer')
+            for position, value, fmt_name in zip(*customerFlagCells(sheet_data)):
+                flagged_cells.setdefault(position, []).append((customer_col_index, value, self.formats[fmt_name]))
+        if 'Abracon Flag' in self.header:
+            abr_flag_col_index = self.header.index('Abracon Flag')
+            positions, fmt_names = abraconFlagFormats(sheet_data['Abracon Flag'])
+            abr_flags = sheet_data['Abracon Flag'].iloc[positions].tolist()
+            for position, abr_flag, fmt_name in zip(positions, abr_flags, fmt_names):
+                flagged_cells.setdefault(position, []).append((abr_flag_col_index, abr_flag, self.formats[fmt_name]))
+
+        for position, row in enumerate(sheet_data.itertuples(index=False, name=None)):
+            self.rows_written += 1
+            row = list(row)
+            row_fmts = {}
+
+            # Format based on flags
+            for col_idx, value, fmt in flagged_cells.get(position, []):
+                row[col_idx] = value
+                row_fmts[col_idx] = fmt
+
+            for col_idx, value in enumerate(row):
+                self.writeCell(self.rows_written, col_idx, value, row_fmts.get(col_idx))
+
+    def writeCell(self, row_idx, col_idx, value, fmt):
+        """Writes one cell the way pandas' to_excel would
+
+        :param: row_idx: zero-based row, header included
+        :param: col_idx: zero-based column
+        :param: value: cell value
+        :param: fmt: xlsxwriter format, or None for the column format
+        """
+
+        if isBlank(value):
+            return
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+        if isinstance(value, datetime.datetime):
+            self.sheet.write_datetime(row_idx, col_idx, value, fmt or self.fmt_date)
+            return
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and np.isinf(value):
+            value = "inf" if value > 0 else "-inf"
+        self.sheet.write(row_idx, col_idx, value, fmt)
+
+    def close(self):
+        """Sizes the columns, sets the header filter and saves the file"""
+
+        if self.rows_written:
+            # Freeze header so it remains stationary when scrolling up or down
+            self.sheet.freeze_panes(1, 0)
+            # Set auto filter
+            self.sheet.autofilter(0, 0, self.rows_written, len(self.header)-1)
+            # Ignore number stored as text error
+            self.sheet.ignore_errors({'number_stored_as_text': 'A1:XFD1048576'})
+
+            for col_idx, col in enumerate(self.header):
+                col_width = min(self.col_widths[col_idx], 35)  # Max width
+                self.sheet.set_column(col_idx, col_idx, col_width, self.formats[columnFormat(col)])
+
+        self.book.close()
+
+    def abort(self):
+        """Gives up on the file after a failed write, so no half-written file is left behind"""
+
+        try:
+            self.book.close()
+        except Exception:  # The write that failed may have left the workbook unsaveable
+            pass
+        removeFile(self.out_path)
+
+
+class DataStreamWriter:
+    """Writes a plain CSV or Parquet output file one block of rows at a time"""
+
+    def __init__(self, out_path, header):
+        self.out_path = out_path
+        self.header = list(header)
+        self.rows_written = 0
+        self.parquet = out_path.lower().endswith(".parquet")
+
+        if self.parquet:
+            # Parquet support is optional, so pyarrow is only needed once a Parquet file is written
+            import pyarrow
+            import pyarrow.parquet
+            self.pyarrow = pyarrow
+            # A column can be blank in one block and filled in another, so each block is kept
+            # in a part file and the column types are only settled once every block is in
+            self.part_paths = []
+            self.column_types = {}
+        else:
+            pd.DataFrame(columns=self.header).to_csv(out_path, index=False)
 
-        for i in sheet_data.index:
-            abr_flag = sheet_data.loc[i, 'Abracon Flag']
+    def writeRows(self, sheet_data):
+        """Appends a block of rows
 
-            if abr_flag == EnumTypes.AbraconFlags.YELLOW_DESC.value:
-                sheet.write(row_index, abr_flag_col_index, abr_flag, fmt_abr_yellow)
-            elif abr_flag == EnumTypes.AbraconFlags.GREEN_DESC.value:
-                sheet.write(row_index, abr_flag_col_index, abr_flag, fmt_abr_green)
-            elif abr_flag == EnumTypes.AbraconFlags.ORANGE_DESC.value:
-                sheet.write(row_index, abr_flag_col_index, abr_flag, fmt_abr_orange)
+        :param: sheet_data: data frame with the same columns as the header
+        """
+
+        if sheet_data.shape[0] == 0:
+            return
+
+        if self.parquet:
+            table = self.pyarrow.Table.from_pandas(parquetColumns(sheet_data[self.header]), preserve_index=False)
+            part_path = self.out_path + "." + str(len(self.part_paths)) + ".part"
+            self.part_paths.append(part_path)
+            self.pyarrow.parquet.write_table(table, part_path)
+            # All-blank columns say nothing about the column's type
+            for field, column in zip(table.schema, table.columns):
+                if column.null_count < len(column):
+                    self.column_types.setdefault(field.name, set()).add(field.type)
+        else:
+            sheet_data[self.header].to_csv(self.out_path, mode='a', header=False, index=False)
+
+        self.rows_written += sheet_data.shape[0]
+
+    def close(self):
+        """Saves the file"""
+
+        if not self.parquet:
+            return
+
+        if not self.part_paths:
+            # No rows at all, just save the header
+            pd.DataFrame(columns=self.header).to_parquet(self.out_path, index=False)
+            return
+
+        schema = self.pyarrow.schema([(col, self.settledType(self.column_types.get(col, set())))
+                                      for col in self.header])
+        with self.pyarrow.parquet.ParquetWriter(self.out_path, schema) as parquet_writer:
+            for part_path in self.part_paths:
+                parquet_writer.write_table(self.pyarrow.parquet.read_table(part_path).cast(schema))
+        for part_path in self.part_paths:
+            removeFile(part_path)
+
+    def settledType(self, types):
+        """Picks one Parquet type for a column from the types of its blocks
+
+        :param types: types of the blocks where the column wasn't blank
+        :return: the one type, float if they were all numbers, otherwise text
+        """
+
+        if len(types) == 1:
+            return next(iter(types))
+        if types and all(self.pyarrow.types.is_integer(value_type) or self.pyarrow.types.is_floating(value_type)
+                         for value_type in types):
+            return self.pyarrow.float64()
+        return self.pyarrow.string()
+
+    def abort(self):
+        """Gives up on the file after a failed write, so no half-written file is left behind"""
+
+        for part_path in self.part_paths if self.parquet else []:
+            removeFile(part_path)
+        removeFile(self.out_path)
+
+
+def removeFile(filepath):
+    """Deletes a file if it is there
+
+    :param filepath: path to the file
+    """
+
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+
+
+def createStreamFile(filename, header):
+    """Creates an output file that rows will be streamed into; formatted
+    Excel, or plain CSV/Parquet data, picked from the file extension
+
+    :param filename: name for our created file
+    :param header: column headers for the file
+    :return: StreamWriter (or DataStreamWriter) for appending rows to this file
+    """
+
+    # Verify output path
+    out_path = output_dir + filename
+    if saveError(out_path):
+        print("..One or more files are currently open in Excel!\n"
+              "..Please close the files and try again.\n"
+              "*Program Terminated*")
+        return
+
+    if filename.lower().endswith(".xlsx"):
+        return StreamWriter(out_path, header)
+
+    try:
+        return DataStreamWriter(out_path, header)
+    except ImportError:
+        print("..Parquet files need pyarrow installed, " + filename + " was not saved.")
+        return
+
+
+def writeExcelFile(filename, sheet_data, stream=None, report=None):
+    """Creates, formats and saves an Excel file from a dataframe
+
+    :param filename: name for our created file
+    :param sheet_data: dataframe which will be copied to this file
+    :param stream: stream rows to disk with formatting applied inline, keeping
+                   memory flat (only for large files if None)
+    :param report: run report each step is timed in (if any)
+    :return: whether the file was saved
+    """
+
+    rows = sheet_data.shape[0]
+    if stream is None:
+        stream = rows >= stream_min_rows
+
+    if stream:
+        with RunReport.stage(report, "xlsx_stream", rows):
+            # Create file
+            stream_writer = createStreamFile(filename, sheet_data.columns)
+            if stream_writer is None:
+                return False
+            try:
+                # Write and format rows a chunk at a time
+                for start in range(0, rows, stream_chunk_rows):
+                    stream_writer.writeRows(sheet_data.iloc[start:start + stream_chunk_rows])
+                # Save the file
+                stream_writer.close()
+            except Exception:
+                # Don't leave a half-written file behind
+                stream_writer.abort()
+                raise
+        print("> New file saved at: " + stream_writer.out_path)
+    else:
+        # Create file
+        with RunReport.stage(report, "xlsx_write", rows):
+            writer = createExcelFile(filename, sheet_data)
+        if writer is None:
+            return False
+        # Format columns in Excel
+        with RunReport.stage(report, "format_sheet", rows):
+            formatSheet(sheet_data, writer)
+        # Save the file
+        with RunReport.stage(report, "xlsx_save", rows):
+            writer.close()
+
+    return True
+
+
+def outputFilenames(filename):
+    """Names the output file once for every format in output_formats
+
+    :param filename: name for our created file (any extension)
+    :return: one filename per output format
+    """
+
+    root = os.path.splitext(filename)[0]
+    return [root + "." + file_format for file_format in output_formats]
+
+
+def writeOutputFiles(filename, sheet_data, stream=None, report=None):
+    """Saves a dataframe in every format in output_formats
+
+    :param filename: name for our created files (the extension follows the format)
+    :param sheet_data: dataframe which will be copied to these files
+    :param stream: stream the Excel file to disk (only for large files if None)
+    :param report: run report each write is timed in (if any)
+    :return: whether every file was saved
+    """
 
-            row_index += 1
+    saved = True
+    for out_filename in outputFilenames(filename):
+        if out_filename.endswith(".xlsx"):
+            saved = writeExcelFile(out_filename, sheet_data, stream, report) and saved
+        else:
+            saved = writeDataFile(out_filename, sheet_data, report) and saved
 
+    return saved
@@ -1,24 +1,14 @@
-import os
-
-import pandas as pd
-from xlrd import XLRDError
-
-import ExcelUtilities
-
-
-def main(std_df):
+def main(std_df, lookups):
     """Automatically fills in end product based on Reported Customer;
     **ASSUME** we are working with Digi-Key
 
     :param std_df: standardized data frame for the insight file
+    :param lookups: lookup tables loaded for this batch
     :return: new data frame with end product column filled in
     """
 
-    # --------------------------
-    #  Load the End Product Map
-    # --------------------------
-
-    end_product_map = ExcelUtilities.loadLookupFile("EndProductMap.xlsx", "EndProductLookup")
+    # The End Product Map was loaded once for the whole batch
+    end_product_map = lookups.end_product_map
 
     # ----------------------------
     #  Fill in End Product column
@@ -1,28 +1,63 @@
-
 import openpyxl
+import pandas as pd
 
 import EnumTypes
 
 
-def main(std_df, filepath):
+# Fill color (RGB hex) -> Abracon Flag description
+FLAG_COLORS = {EnumTypes.AbraconFlags.YELLOW_HEX.value: EnumTypes.AbraconFlags.YELLOW_DESC.value,
+               EnumTypes.AbraconFlags.GREEN_HEX.value: EnumTypes.AbraconFlags.GREEN_DESC.value,
+               EnumTypes.AbraconFlags.ORANGE_HEX.value: EnumTypes.AbraconFlags.ORANGE_DESC.value}
 
-    workbook = openpyxl.load_workbook(filepath, data_only=True)
 
-    sheet = workbook.worksheets[0]
+def readFlagColors(sheet):
+    """Streams down column A once, picking up the fill color of every data row
 
-    std_df.loc[0, 'Abracon Flag'] = ""  # initialize Abracon Flag column
+    :param sheet: first worksheet of the Abracon report (opened read-only)
+    :return: RGB hex fill color of each data row, blank if not an RGB color
+    """
 
-    for i in std_df.index:
-        cell = "A" + str(i+1)
-        color_index = sheet[cell].fill.start_color.index
-        color_in_hex = color_index[2:]
+    # Read-only sheets trust the file's recorded dimensions, which some exporters get wrong
+    sheet.reset_dimensions()
 
-        if color_in_hex == EnumTypes.AbraconFlags.YELLOW_HEX.value:
-            std_df.loc[i-1, 'Abracon Flag'] = EnumTypes.AbraconFlags.YELLOW_DESC.value
-        elif color_in_hex == EnumTypes.AbraconFlags.GREEN_HEX.value:
-            std_df.loc[i-1, 'Abracon Flag'] = EnumTypes.AbraconFlags.GREEN_DESC.value
-        elif color_in_hex == EnumTypes.AbraconFlags.ORANGE_HEX.value:
-            std_df.loc[i-1, 'Abracon Flag'] = EnumTypes.AbraconFlags.ORANGE_DESC.value
+    colors = []
+    # Row 1 is the header, so data row j sits on sheet row j+2
+    for (cell,) in sheet.iter_rows(min_row=2, min_col=1, max_col=1):
+        fill = getattr(cell, 'fill', None)  # Empty cells carry no style at all
+        color_index = fill.start_color.index if fill is not None else None
+        # Theme/indexed colors come back as numbers and are never flag colors
+        colors.append(color_index[2:] if isinstance(color_index, str) else "")
 
-    return std_df
+    return colors
+
+
+def readReport(filepath):
+    """Loads the Abracon report and its color-coding from a single
+    read-only open of the workbook
+
+    :param filepath: path to Abracon insight file
+    :return: insight file data frame, fill color of each data row
+    """
+
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+
+    # Read the colors first, pandas closes the workbook once it is done with it
+    colors = readFlagColors(workbook.worksheets[0])
+    ins_df = pd.read_excel(workbook, sheet_name=0, engine='openpyxl').fillna("")
 
+    return ins_df, colors
+
+
+def main(std_df, colors):
+    """Sets the Abracon Flag of every row from the report's color-coding
+
+    :param std_df: standardized data frame for the Abracon report
+    :param colors: fill color of each data row, from readReport
+    :return: standardized data frame with the Abracon Flag column filled in
+    """
+
+    # Pandas drops trailing rows that only hold formatting, so match up by position
+    colors = (colors + [""] * len(std_df))[:len(std_df)]
+    std_df['Abracon Flag'] = pd.Series(colors, index=std_df.index, dtype=object).map(FLAG_COLORS).fillna("")
+
+    return std_df
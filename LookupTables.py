@@ -0,0 +1,99 @@
+import hashlib
+
+import pandas as pd
+
+import AssignSalesReps
+import EnumTypes
+import ExcelUtilities
+import StandardizeColumns
+
+
+class LookupTables:
+    """Every lookup table the Clean pipeline needs, loaded once
+    and shared by all the insight files in a batch"""
+
+    def __init__(self, root_column_library, customer_to_proper_name_map, mstr_account_list,
+                 mstr_territory_list, end_product_map=None):
+        self.root_column_library = root_column_library
+        self.customer_to_proper_name_map = customer_to_proper_name_map
+        self.mstr_account_list = mstr_account_list
+        self.mstr_territory_list = mstr_territory_list
+        self.end_product_map = end_product_map
+
+        # Compile the look-ups once so every file in the batch can reuse them
+        self.column_index = StandardizeColumns.getColumnIndex(root_column_library)
+        # Sales rep look-ups are only built (and resolutions only loaded) once needed
+        self._sales_rep_index = None
+        self._resolution_cache = None
+
+        # Anything worked out from these tables can be cached against these
+        self.sales_rep_fingerprint = tableFingerprint(customer_to_proper_name_map, mstr_account_list,
+                                                      mstr_territory_list)
+        self.fingerprint = tableFingerprint(root_column_library, end_product_map) + self.sales_rep_fingerprint
+
+    @property
+    def sales_rep_index(self):
+        """Look-ups for assigning sales reps, built the first time a customer
+        or zip code isn't in the resolution cache"""
+
+        if self._sales_rep_index is None:
+            self._sales_rep_index = AssignSalesReps.SalesRepIndex(self.customer_to_proper_name_map,
+                                                                  self.mstr_account_list, self.mstr_territory_list)
+        return self._sales_rep_index
+
+    @property
+    def resolution_cache(self):
+        """Customer and zip code resolutions saved by earlier runs with the same lookup files"""
+
+        if self._resolution_cache is None:
+            self._resolution_cache = AssignSalesReps.loadResolutionCache(self.sales_rep_fingerprint)
+        return self._resolution_cache
+
+
+def tableFingerprint(*tables):
+    """Identifies the contents of lookup tables, so results cached from
+    them are only reused while the lookup files say the same thing
+
+    :param tables: dataframes (None for a table that isn't loaded)
+    :return: hex digest of the tables' columns and values
+    """
+
+    digest = hashlib.md5()
+    for table in tables:
+        if table is None:
+            digest.update(b"None")
+            continue
+        digest.update(repr(list(table.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(table, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def load(company):
+    """Loads every lookup file needed to clean this company's insight files
+
+    :param company: company that provided the insight files
+    :return: lookup tables, or None if any lookup file could not be loaded
+    """
+
+    root_column_library = ExcelUtilities.loadLookupFile("RootColumnLibrary.xlsx", "Standardize Columns")
+    customer_to_proper_name_map = ExcelUtilities.loadLookupFile("rootCustomerMappings.xlsx", "Sales Lookup",
+                                                                 usecols=['Root Customer', 'ProperName'])
+    mstr_account_list = ExcelUtilities.loadLookupFile("Master Account List.xlsx", "Allacct",
+                                                       usecols=['ProperName', 'SLS'])
+    mstr_territory_list = ExcelUtilities.loadLookupFile("CAZipCode.xlsx", "CA_BASIC_ROSTER",
+                                                         usecols=['ZipCode', 'Sls'])
+    lookup_files = [root_column_library, customer_to_proper_name_map, mstr_account_list, mstr_territory_list]
+
+    # Only Digi-Key files get end products filled in
+    end_product_map = None
+    if company == EnumTypes.Company.DGK:
+        end_product_map = ExcelUtilities.loadLookupFile("EndProductMap.xlsx", "EndProductLookup",
+                                                         usecols=['Proper Name', 'End Product'])
+        lookup_files.append(end_product_map)
+
+    # Error messages have already been printed by loadLookupFile
+    if any(lookup_file is None for lookup_file in lookup_files):
+        return
+
+    return LookupTables(root_column_library, customer_to_proper_name_map, mstr_account_list,
+                        mstr_territory_list, end_product_map)
@@ -0,0 +1,65 @@
+def digitsOnly(column):
+    """Filters out all non-numeric characters from every value in a column
+
+    :param column: series of values (any type)
+    :return: series of digit strings, blank where there were no digits
+    """
+
+    return column.astype(str).str.replace(r"\D", "", regex=True).fillna("")
+
+
+def formatZipCodes(column):
+    """Formats all zip codes to #####-#### (no trailing four zeroes)
+
+    :param column: series of raw zip codes
+    :return: series of formatted zip codes
+    """
+
+    zip_codes = digitsOnly(column)
+    lengths = zip_codes.str.len()
+    trailing_zeroes = zip_codes.str.endswith("0000")
+
+    formatted = zip_codes.copy()
+    # If length 9, send to XXXXX-XXXX
+    zip_plus_four = (lengths == 9) & ~trailing_zeroes
+    formatted[zip_plus_four] = zip_codes[zip_plus_four].str[:5] + "-" + zip_codes[zip_plus_four].str[-4:]
+    # Trim trailing four zeroes
+    formatted[trailing_zeroes] = zip_codes[trailing_zeroes].str[:-4]
+
+    return formatted
+
+
+def formatPhoneNumbers(column):
+    """Formats all phone numbers to #(XXX) XXX-XXXX
+
+    :param column: series of raw phone numbers
+    :return: series of formatted phone numbers
+    """
+
+    phone_numbers = digitsOnly(column)
+    lengths = phone_numbers.str.len()
+
+    formatted = phone_numbers.copy()
+    ten_digits = phone_numbers[lengths == 10]
+    formatted[lengths == 10] = "(" + ten_digits.str[:3] + ") " + ten_digits.str[3:6] + "-" + ten_digits.str[6:]
+    eleven_digits = phone_numbers[lengths == 11]
+    formatted[lengths == 11] = eleven_digits.str[:1] + "(" + eleven_digits.str[1:4] + ") " +\
+        eleven_digits.str[4:7] + "-" + eleven_digits.str[7:]
+
+    return formatted
+
+
+def zipCodePrefixes(column):
+    """Pulls the first five digits out of formatted zip codes,
+    since that is all the territory look-up cares about
+
+    :param column: series of zip codes formatted by formatZipCodes
+    :return: series of five-character zip codes, blank if too small or too large
+    """
+
+    zip_codes = column.astype(str)
+    lengths = zip_codes.str.len()
+
+    prefixes = zip_codes.str[:5].where((lengths == 10) | (lengths == 5), "")
+
+    return prefixes.fillna("")
@@ -0,0 +1,163 @@
+import contextlib
+import ctypes
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+# Also trace the peak Python memory of each stage on its own; tracemalloc
+# makes allocation-heavy stages several times slower, so it is off by default
+track_memory = False
+
+
+def peakMemoryMb():
+    """Measures the most memory the process has held so far (peak resident set)
+
+    :return: peak memory in MB, or None if it can't be measured here
+    """
+
+    try:
+        if sys.platform == "win32":
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t), ("PagefileUsage", ctypes.c_size_t),
+                            ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return None
+            return round(counters.PeakWorkingSetSize / 1048576, 1)
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return round(peak / 1048576 if sys.platform == "darwin" else peak / 1024, 1)
+    except (ImportError, AttributeError, OSError):
+        return None
+
+
+class RunReport:
+    """Times each stage of one Clean, Split or Compile run, printing
+    the numbers as it goes and saving them as JSON next to the output"""
+
+    def __init__(self, operation, input_files):
+        self.operation = operation
+        self.input_files = [os.path.basename(filepath) for filepath in input_files]
+        self.started = datetime.datetime.now()
+        self.start_time = time.perf_counter()
+        self.stages = []
+
+        # Only stop tracing at the end if this report started it
+        self.tracing = track_memory and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Times one stage; the rows it handled can be given up front
+        or filled in on the yielded record once they are known
+
+        :param name: name of the stage
+        :param rows: number of rows the stage handled
+        :return: record for this stage
+        """
+
+        record = {'stage': name, 'rows': rows}
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start_time, 4)
+            record['peak_mb'] = peakMemoryMb()
+            if tracemalloc.is_tracing():
+                record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1048576, 1)
+            if record['rows'] and record['seconds']:
+                record['rows_per_second'] = round(record['rows'] / record['seconds'])
+            self.stages.append(record)
+            print(describeStage(record))
+
+    def stopTracing(self):
+        """Stops tracking memory, if this report started it"""
+
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def save(self, out_path, output_files):
+        """Saves the report as JSON
+
+        :param out_path: path for the report
+        :param output_files: names of the files this run saved
+        """
+
+        self.stopTracing()
+
+        report = {'operation': self.operation,
+                  'started': self.started.isoformat(timespec="seconds"),
+                  'seconds': round(time.perf_counter() - self.start_time, 4),
+                  'input_files': self.input_files,
+                  'output_files': [os.path.basename(filename) for filename in output_files],
+                  'stages': self.stages}
+
+        try:
+            with open(out_path, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+        except OSError:
+            print("..Unable to save run report at: " + out_path)
+            return
+
+        print("> " + self.operation + " took " + str(round(report['seconds'], 2)) + "s, run report saved at: " +
+              out_path)
+
+
+def describeStage(record):
+    """Sums up one stage for the console
+
+    :param record: stage record from RunReport.stage
+    :return: console line
+    """
+
+    line = "> " + record['stage'] + ": " + str(round(record['seconds'], 2)) + "s"
+    if record.get('rows_per_second'):
+        line += ", " + format(record['rows'], ",") + " rows (" + format(record['rows_per_second'], ",") + " rows/s)"
+    if record.get('peak_mb') is not None:
+        line += ", peak " + str(record['peak_mb']) + " MB"
+    if 'traced_peak_mb' in record:
+        line += " (" + str(record['traced_peak_mb']) + " MB traced in this stage)"
+    return line
+
+
+def stage(report, name, rows=None):
+    """Times a stage in the report, or does nothing if there is no report
+
+    :param report: run report (or None)
+    :param name: name of the stage
+    :param rows: number of rows the stage handles
+    :return: context manager for the stage
+    """
+
+    if report is None:
+        return contextlib.nullcontext({'stage': name, 'rows': rows})
+    return report.stage(name, rows)
+
+
+def reportPath(out_dir, filename):
+    """Names the run report saved next to an output file
+
+    :param out_dir: folder the output file is saved in
+    :param filename: name of the output file
+    :return: path for the run report
+    """
+
+    return out_dir + os.path.splitext(filename)[0] + ".run.json"
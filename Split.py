@@ -1,51 +1,48 @@
 import os
-
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import ExcelUtilities
+import RunReport
+
+
+# Most rep files written at the same time
+SPLIT_WORKERS = 4
 
 
-def main(filepath):
+def main(filepath, max_workers=SPLIT_WORKERS):
     """Splits up the cleaned insight file into several files,
     one for each sales rep
 
     :param filepath: path to cleaned file
-    :return: export one file for each salesperson
+    :param max_workers: most rep files written at the same time
+    :return: whether one file was exported for each salesperson
     """
 
+    # Time each stage for the console and the run report
+    report = RunReport.RunReport("Split", [filepath])
+
     # ------------------------
     #  Load standardized file
     # ------------------------
 
-    std_df = pd.read_excel(filepath, sheet_name=0).fillna("")
+    with report.stage("read_standardized") as stage:
+        std_df = ExcelUtilities.readDataFile(filepath).fillna("")
+        stage['rows'] = std_df.shape[0]
     header = std_df.columns
 
     # ------------------------------------------
     #  Separate rep data into unique dataframes
     # ------------------------------------------
 
+    # Partition in a single grouped pass; reps stay in the order they first appear,
+    # rows keep their original order, and blank OSR values get their own file
     reps = []
     rep_dfs = []
 
-    for i in std_df.index:
-        sales_rep = std_df.loc[i, 'OSR']
-
-        if sales_rep in reps:
-            # Find the rep's index in the dataframe collection
-            rep_index = reps.index(sales_rep)
-            # Get rep's dataframe
-            rep_df = rep_dfs[rep_index]
-            # Append rep's row to their dataframe
-            rep_df.loc[rep_df.size] = std_df.iloc[i]
-        else:
-            # Add rep to indexing map
+    with report.stage("partition", std_df.shape[0]):
+        for sales_rep, rep_df in std_df.groupby('OSR', sort=False, dropna=False):
             reps.append(sales_rep)
-            # Construct a new dataframe for this rep
-            rep_df = pd.DataFrame(columns=header)
-            # Add the first entry to the dataframe
-            rep_df.loc[0] = std_df.iloc[i]
-            # Add dataframe to the collection
-            rep_dfs.append(rep_df)
+            rep_dfs.append(rep_df.reset_index(drop=True))
 
     # ----------------------------------------
     #  Export each dataframe as an Excel file
@@ -54,22 +51,35 @@ def main(filepath):
     # Strip root off filepath to get filename
     in_filename = os.path.basename(filepath)
 
-    rep_index = 0  # Track each rep's dataframe
-    for rep in reps:
-
-        rep_df = rep_dfs[rep_index]
-
-        out_filename = "[" + rep + "] " + in_filename
-
-        # Create file
-        writer = ExcelUtilities.createExcelFile(out_filename, rep_df)
-        # Format columns in Excel
-        ExcelUtilities.formatSheet(rep_df, writer)
-        # Save the file
-        writer.save()
-
-        rep_index += 1
+    # Write several reps' files at once, reporting each one as it finishes
+    with report.stage("write_rep_files", std_df.shape[0]), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for rep, rep_df in zip(reps, rep_dfs):
+            out_filename = "[" + str(rep) + "] " + in_filename
+            futures[executor.submit(ExcelUtilities.writeOutputFiles, out_filename, rep_df)] = out_filename
+
+        files_done = 0
+        all_saved = True
+        for future in as_completed(futures):
+            files_done += 1
+            # One file per output format
+            saved_filenames = ", ".join(ExcelUtilities.outputFilenames(futures[future]))
+            if future.result():
+                print("> Finished " + str(files_done) + " of " + str(len(futures)) + ": " + saved_filenames)
+            else:
+                print("..Unable to save " + saved_filenames)
+                all_saved = False
+
+    split_filename = os.path.splitext(in_filename)[0] + " (Split)" + os.path.splitext(in_filename)[1]
+    report.save(RunReport.reportPath(ExcelUtilities.output_dir, split_filename),
+                [saved_filename for out_filename in futures.values()
+                 for saved_filename in ExcelUtilities.outputFilenames(out_filename)])
+
+    if not all_saved:
+        return False
 
     # Success message
     print("> File successfully split!\n"
           "*Program Complete*")
+
+    return True
@@ -1,158 +1,168 @@
-import os
-
-import numpy as np
 import pandas as pd
-from xlrd import XLRDError
-import openpyxl
-import xlsxwriter
 
 import EnumTypes
-import ExcelUtilities
+import Normalize
+
+
+# Last compiled root column library, reused while the library is unchanged
+_column_index = None
+
 
+class ColumnIndex:
+    """Compiled alias -> root column look-up for the root column library,
+    plus a memo of the mapping plans already resolved against it"""
 
-def main(ins_df, company):
+    def __init__(self, root_column_library):
+        self.root_column_library = root_column_library
+
+        # Every alias (and the root column name itself) maps to the root columns it
+        # matches, in library order; all lowercase so the look-up is not case-sensitive
+        self.aliases = {}
+        for root_col in root_column_library.columns:
+            names = [str(alias).lower() for alias in root_column_library[root_col].values]
+            names.append(root_col.lower())
+            for name in dict.fromkeys(names):
+                self.aliases.setdefault(name, []).append(root_col)
+
+        # (company, insight header) -> (standard header, matched columns)
+        self.plans = {}
+
+    def mappingPlan(self, company, ins_cols):
+        """Resolves the standard header and the insight column feeding
+        each root column, memoized per company and insight header
+
+        :param company: company that provided the insight file
+        :param ins_cols: lowercase insight file column headers
+        :return: standard header, {root column: insight column}
+        """
+
+        key = (company, tuple(ins_cols))
+        if key in self.plans:
+            return self.plans[key]
+
+        # Pull standard columns from root column library
+        header = list(self.root_column_library)
+        # Remove first/last name columns
+        header = header[:-2]
+        # For Digi-Key: add feedback columns
+        if company == EnumTypes.Company.DGK:
+            header.insert(3, 'Information for Digi-Key')
+            header.insert(3, 'How Contacted')
+            header.insert(3, '(Suggested) End Product')
+            header.insert(3, 'Must Contact')
+        # Add flag column for future use
+        header.append('Flag')
+
+        # Later insight columns overwrite earlier ones for the same root column
+        matched_cols = {}
+        for ins_col in ins_cols:
+            for root_col in self.aliases.get(ins_col, []):
+                matched_cols[root_col] = ins_col
+
+        self.plans[key] = (header, matched_cols)
+        return self.plans[key]
+
+
+def getColumnIndex(root_column_library):
+    """Compiles the root column library, reusing the previous
+    index (and its memoized plans) if the library has not changed
+
+    :param root_column_library: data frame loaded from RootColumnLibrary.xlsx
+    :return: compiled column index
+    """
+
+    global _column_index
+    if _column_index is None or not _column_index.root_column_library.equals(root_column_library):
+        _column_index = ColumnIndex(root_column_library)
+    return _column_index
+
+
+def main(ins_df, company, lookups):
     """Matches insight file columns to standard columns to
     organize the data to TAARCOM, Inc. standards
 
     :param: ins_df: data frame for the working insight file
     :param: company: company that provided the insight file
+    :param: lookups: lookup tables loaded for this batch
     :return: insight file with standardized columns
     """
 
-    # -----------------------------
-    #  Load the root column libray
-    # -----------------------------
-
-    root_column_library = ExcelUtilities.loadLookupFile("RootColumnLibrary.xlsx", "Standardize Columns")
-
-    # --------------------------------
-    #  Create standard file dataframe
-    # --------------------------------
-
-    # Pull standard columns from root column library
-    header = list(root_column_library)
-    # Remove first/last name columns
-    header = header[:-2]
-    # For Digi-Key: add feedback columns
-    if company == EnumTypes.Company.DGK:
-        header.insert(3, 'Information for Digi-Key')
-        header.insert(3, 'How Contacted')
-        header.insert(3, '(Suggested) End Product')
-        header.insert(3, 'Must Contact')
-    # Add flag column for future use
-    header.append('Flag')
-    # Create dataframe with standard columns
-    std_df = pd.DataFrame(columns=header).fillna("")
+    # The root column library was compiled once for the whole batch
+    column_index = lookups.column_index
 
     # ------------------------------------------------
     #  Match insight file columns to standard columns
     # ------------------------------------------------
 
-    # Make values in root column library all lowercase so the column look-up is not case-sensitive
-    for i in root_column_library.index:
-        for root_col in root_column_library.columns:
-            root_column_library.loc[i, root_col] = str(root_column_library.loc[i, root_col]).lower()
-
-    # Also lower column headers
+    # Lower column headers so the column look-up is not case-sensitive
     ins_df.columns = [str(col_header).lower() for col_header in ins_df.columns]
 
+    # Repeat files from the same company skip straight to the saved plan
+    header, matched_cols = column_index.mappingPlan(company, ins_df.columns)
+
     # Store names of insight file columns for later formatting
-    first_name_col = ""
-    last_name_col = ""
-    quantity_col = ""
-    unit_price_col = ""
-    invoiced_dollars_col = ""
-    zip_code_col = ""
-    phone_number_col = ""
-
-    for ins_col in ins_df.columns:  # For each insight file column
-        for root_col in root_column_library.columns:  # Check if it matches any root column
-            if ins_col in [col.lower() for col in root_column_library[root_col].values] or ins_col == root_col.lower():
-                # Save insight column name for future use (filling in blanks/formatting)
-                if root_col == 'First Name':
-                    first_name_col = ins_col
-                elif root_col == 'Last Name':
-                    last_name_col = ins_col
-                elif root_col == 'Quantity':
-                    quantity_col = ins_col
-                elif root_col == 'Unit Price':
-                    unit_price_col = ins_col
-                elif root_col == 'Invoiced Dollars':
-                    invoiced_dollars_col = ins_col
-                elif root_col == 'Zip Code':
-                    zip_code_col = ins_col
-                elif root_col == 'Phone':
-                    phone_number_col = ins_col
-
-                # As long as we are not in the first or last name columns
-                if not root_col == 'First Name' and not root_col == 'Last Name':
-                    # Copy contents of insight column to matching root column
-                    for i in ins_df.index:
-                        std_df.loc[i, root_col] = ins_df.loc[i, ins_col]
+    first_name_col = matched_cols.get('First Name', "")
+    last_name_col = matched_cols.get('Last Name', "")
+    quantity_col = matched_cols.get('Quantity', "")
+    unit_price_col = matched_cols.get('Unit Price', "")
+    invoiced_dollars_col = matched_cols.get('Invoiced Dollars', "")
+    zip_code_col = matched_cols.get('Zip Code', "")
+    phone_number_col = matched_cols.get('Phone', "")
+
+    # First/last name are combined later rather than copied
+    matched_cols = {root_col: ins_col for root_col, ins_col in matched_cols.items()
+                    if root_col != 'First Name' and root_col != 'Last Name'}
+
+    # --------------------------------
+    #  Create standard file dataframe
+    # --------------------------------
+
+    # Pre-size the frame to the insight file (no rows at all if nothing matched)
+    std_index = ins_df.index if matched_cols else pd.RangeIndex(0)
+    std_df = pd.DataFrame(index=std_index, columns=header, dtype=object)
+
+    # Copy each matched insight column over as a whole
+    for root_col, ins_col in matched_cols.items():
+        std_df[root_col] = ins_df[ins_col]
 
     # ---------------------------------
     #  Fill in blanks / Format columns
     # ---------------------------------
 
-    for i in std_df.index:
-        # Fill distributor/principal based on the company that provided this file (dropdown menu)
-        if company == EnumTypes.Company.DGK or company == EnumTypes.Company.MOU:
-            std_df.loc[i, 'Reported Distributor'] = company.value
-        elif company == EnumTypes.Company.ABR:
-            std_df.loc[i, 'Principal'] = company.value
-
-        # Combine first and last name into 'Name'
-        if first_name_col and last_name_col:
-            std_df.loc[i, 'Name'] = str(ins_df.loc[i, first_name_col]) + " " + str(ins_df.loc[i, last_name_col])
-
-        # Invoiced dollars = quantity * unit price
-        if quantity_col and unit_price_col and not invoiced_dollars_col:
-            std_df.loc[i, 'Invoiced Dollars'] = float(ins_df.loc[i, quantity_col]) * float(ins_df.loc[i, unit_price_col])
-        # Unit price = invoiced dollars / quantity
-        if quantity_col and invoiced_dollars_col and not unit_price_col:
-            quantity = ins_df.loc[i, quantity_col]
-            if quantity:  # Make sure we don't divide by zero
-                std_df.loc[i, 'Unit Price'] = float(ins_df.loc[i, invoiced_dollars_col]) / float(quantity)
-        # Quantity = invoiced dollars / unit price
-        if invoiced_dollars_col and unit_price_col and not quantity_col:
-            unit_price = ins_df.loc[i, unit_price_col]
-            if unit_price:  # Make sure we don't divide by zero
-                std_df.loc[i, 'Quantity'] = float(ins_df.loc[i, invoiced_dollars_col]) / float(unit_price)
-
-        # Format all zip codes to #####-#### (no trailing four zeroes)
-        if zip_code_col:
-            # Convert to string
-            zip_code = str(std_df.loc[i, 'Zip Code'])
-
-            # Filter out all non-numeric characters
-            numeric_filter = filter(str.isdigit, zip_code)
-            zip_code = "".join(numeric_filter)
-
-            # Trim trailing four zeroes
-            if zip_code.endswith("0000"):
-                zip_code = zip_code[:-4]
-            # If length 9, send to XXXXX-XXXX
-            elif len(zip_code) == 9:
-                zip_code = zip_code[:5] + "-" + zip_code[-4:]
-
-            std_df.loc[i, 'Zip Code'] = zip_code
-
-        # Format all phone numbers to #(XXX) XXX-XXXX
-        if phone_number_col:
-            # Convert to string
-            phone_number = str(std_df.loc[i, 'Phone'])
-
-            # Filter out all non-numeric characters
-            numeric_filter = filter(str.isdigit, phone_number)
-            phone_number = "".join(numeric_filter)
-
-            if len(phone_number) == 10:
-                phone_number = "(" + phone_number[:3] + ") " + phone_number[3:6] + "-" + phone_number[6:]
-            elif len(phone_number) == 11:
-                phone_number = phone_number[:1] + "(" + phone_number[1:4] + ") " +\
-                               phone_number[4:7] + "-" + phone_number[7:]
-
-            std_df.loc[i, 'Phone'] = phone_number
+    # Fill distributor/principal based on the company that provided this file (dropdown menu)
+    if company == EnumTypes.Company.DGK or company == EnumTypes.Company.MOU:
+        std_df['Reported Distributor'] = company.value
+    elif company == EnumTypes.Company.ABR:
+        std_df['Principal'] = company.value
+
+    # Combine first and last name into 'Name'
+    if first_name_col and last_name_col:
+        std_df['Name'] = ins_df[first_name_col].astype(str) + " " + ins_df[last_name_col].astype(str)
+
+    # Blank or non-numeric money values become NaN rather than stopping the whole file
+    quantity = pd.to_numeric(ins_df[quantity_col], errors='coerce') if quantity_col else None
+    unit_price = pd.to_numeric(ins_df[unit_price_col], errors='coerce') if unit_price_col else None
+    invoiced_dollars = pd.to_numeric(ins_df[invoiced_dollars_col], errors='coerce') if invoiced_dollars_col else None
+
+    # Invoiced dollars = quantity * unit price
+    if quantity_col and unit_price_col and not invoiced_dollars_col:
+        std_df['Invoiced Dollars'] = quantity * unit_price
+    # Unit price = invoiced dollars / quantity
+    if quantity_col and invoiced_dollars_col and not unit_price_col:
+        # Mask out zero quantities so we don't divide by zero
+        std_df['Unit Price'] = (invoiced_dollars / quantity).where(quantity != 0)
+    # Quantity = invoiced dollars / unit price
+    if invoiced_dollars_col and unit_price_col and not quantity_col:
+        # Mask out zero unit prices so we don't divide by zero
+        std_df['Quantity'] = (invoiced_dollars / unit_price).where(unit_price != 0)
+
+    # Format all zip codes to #####-#### (no trailing four zeroes)
+    if zip_code_col:
+        std_df['Zip Code'] = Normalize.formatZipCodes(std_df['Zip Code'])
+
+    # Format all phone numbers to #(XXX) XXX-XXXX
+    if phone_number_col:
+        std_df['Phone'] = Normalize.formatPhoneNumbers(std_df['Phone'])
 
     # Return standardized data frame
     return std_df
@@ -0,0 +1,164 @@
+import argparse
+import os
+import sys
+
+import EnumTypes
+
+
+# Exit codes for batch jobs
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1  # One or more files could not be processed
+EXIT_USAGE = 2  # Bad command line (set by argparse)
+
+
+def cleanFiles(args):
+    """Runs Clean on every insight file given
+
+    :param args: parsed command line arguments
+    :return: whether every file was cleaned
+    """
+
+    # Pandas and friends are only imported once there is work to do
+    import Clean
+    import LookupTables
+
+    company = EnumTypes.Company[args.company]
+
+    # Make sure the files are not already standardized
+    filepaths = []
+    all_cleaned = True
+    for filepath in args.filepaths:
+        filename = os.path.basename(filepath)
+        if "Standardized" in filename:
+            print(".." + filename + " has already been cleaned.")
+            all_cleaned = False
+        else:
+            filepaths.append(filepath)
+    if not filepaths:
+        return False
+
+    # Load the lookup files once for the whole batch
+    lookups = LookupTables.load(company)
+    if lookups is None:
+        return False
+
+    # Spread multiple files across processes
+    if len(filepaths) > 1:
+        cleaned = Clean.mainParallel(filepaths, company, lookups, args.workers, args.stream, args.incremental)
+        return cleaned and all_cleaned
+    return Clean.main(filepaths[0], company, lookups, args.stream, args.incremental) and all_cleaned
+
+
+def splitFiles(args):
+    """Runs Split on every standardized file given
+
+    :param args: parsed command line arguments
+    :return: whether every file was split
+    """
+
+    import Split
+
+    max_workers = args.workers if args.workers else Split.SPLIT_WORKERS
+
+    all_split = True
+    for filepath in args.filepaths:
+        # Make sure the file is standardized
+        if "Standardized" not in os.path.basename(filepath):
+            print("..Split can only be run on standardized files.\n"
+                  "..Make sure the filename contains \"Standardized\".")
+            all_split = False
+            continue
+        all_split = Split.main(filepath, max_workers) and all_split
+
+    return all_split
+
+
+def compileFiles(args):
+    """Runs Compile on the feedback files given
+
+    :param args: parsed command line arguments
+    :return: whether the files were compiled
+    """
+
+    import Compile
+
+    # Make sure there are multiple files
+    if len(args.filepaths) < 2:
+        print("..Compiling requires multiple files.")
+        return False
+
+    return Compile.main(args.filepaths, args.stream)
+
+
+def parseArgs(argv):
+    """Reads the command line
+
+    :param argv: command line arguments (without the program name)
+    :return: parsed arguments
+    """
+
+    parser = argparse.ArgumentParser(prog="cli.py",
+                                     description="Run Clean, Split or Compile without the GUI. Exit code is 0 if "
+                                                 "every file was processed, 1 if any failed, 2 on a bad command line.")
+    parser.add_argument("--lookup-dir", help="folder holding the lookup files (default: W:/Lookup/)")
+    parser.add_argument("--output-dir", help="folder output files are saved in (default: W:/Output/)")
+    parser.add_argument("--format", dest="formats", action="append", choices=["xlsx", "csv", "parquet"],
+                        help="format every output file is saved in, repeat for several (default: xlsx)")
+    operations = parser.add_subparsers(dest="operation", metavar="operation", required=True)
+
+    clean_parser = operations.add_parser("clean", help="standardize insight files and assign sales reps")
+    clean_parser.add_argument("filepaths", nargs="+", help="insight files")
+    clean_parser.add_argument("--company", required=True, choices=[company.name for company in EnumTypes.Company],
+                              help="company that provided the insight files")
+    clean_parser.add_argument("--workers", type=int, help="processes used for several files (default: one per CPU)")
+    clean_parser.add_argument("--stream", action="store_true", default=None,
+                              help="stream the output to disk (default: only for large files)")
+    clean_parser.add_argument("--incremental", action="store_true",
+                              help="reuse rows cleaned last time, only cleaning new or changed rows")
+    clean_parser.set_defaults(run=cleanFiles)
+
+    split_parser = operations.add_parser("split", help="split standardized files into one file per sales rep")
+    split_parser.add_argument("filepaths", nargs="+", help="standardized files")
+    split_parser.add_argument("--workers", type=int, help="rep files written at the same time (default: 4)")
+    split_parser.set_defaults(run=splitFiles)
+
+    compile_parser = operations.add_parser("compile", help="stitch feedback files into one report")
+    compile_parser.add_argument("filepaths", nargs="+", help="feedback files, all with the same columns")
+    compile_parser.add_argument("--stream", action="store_true",
+                                help="write each file straight to the report instead of holding all of them")
+    compile_parser.set_defaults(run=compileFiles)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Runs one operation from the command line
+
+    :param argv: command line arguments (sys.argv[1:] if None)
+    :return: exit code
+    """
+
+    args = parseArgs(sys.argv[1:] if argv is None else argv)
+
+    import ExcelUtilities
+    if args.lookup_dir:
+        ExcelUtilities.lookup_dir = os.path.join(args.lookup_dir, "")
+    if args.output_dir:
+        ExcelUtilities.output_dir = os.path.join(args.output_dir, "")
+        os.makedirs(ExcelUtilities.output_dir, exist_ok=True)
+    if args.formats:
+        ExcelUtilities.output_formats = args.formats
+
+    try:
+        succeeded = args.run(args)
+    except Exception as error:
+        print("..Unexpected Python error:\n" +
+              "?" + str(error) + "\n" +
+              "..Please contact your local coder.")
+        succeeded = False
+
+    return EXIT_SUCCESS if succeeded else EXIT_FAILURE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
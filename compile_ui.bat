@@ -0,0 +1,2 @@
+pyuic5 AutomateExcel.ui -o AutomateExcelUi.py
+@pause
\ No newline at end of file
@@ -3,4 +3,6 @@ pip install pandas
 pip install xlrd
 pip install openpyxl
 pip install xlsxwriter
+pip install python-calamine
+pip install pyarrow
 @pause
\ No newline at end of file
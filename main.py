@@ -1,18 +1,26 @@
 import os
 import sys
+import time
+
+# Taken before anything else loads, for --startup-time
+START_TIME = time.perf_counter()
 
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import pyqtSlot
 from PyQt5.QtWidgets import QDialog, QApplication, QFileDialog
-from PyQt5.uic import loadUi
 
-import Clean
-import Compile
+# Clean, Split and Compile (and pandas with them) are imported when an operation
+# first runs, so the window doesn't wait on the data libraries
+from AutomateExcelUi import Ui_AutomateExcel
 import EnumTypes
-import Split
 
 VERSION = "Master v1.0.0"
 
+# Processes used to clean several files at once (one per CPU if None)
+CLEAN_WORKERS = None
+# Reuse rows cleaned last time and only clean new or changed rows of a revised insight file
+INCREMENTAL_CLEAN = False
+
 
 class Stream(QtCore.QObject):
     """Redirects console output to text widget"""
@@ -26,14 +34,15 @@ class Stream(QtCore.QObject):
         pass
 
 
-class MainWindow(QDialog):
+class MainWindow(QDialog, Ui_AutomateExcel):
     """Generates the main window for our program"""
 
     def __init__(self):
         super(MainWindow, self).__init__()
 
         # External UI design w/ QTDesigner ;)
-        loadUi("AutomateExcel.ui", self)
+        # Precompiled from AutomateExcel.ui, rerun compile_ui.bat after editing it
+        self.setupUi(self)
 
         # Initialize the threadpool for handling worker jobs
         self.threadpool = QtCore.QThreadPool()
@@ -110,6 +119,8 @@ class MainWindow(QDialog):
         if rcl_exists and cpm_exists and mal_exists and mtl_exists:
             # Run the Clean.py file.
             try:
+                import Clean
+                import LookupTables
                 # Get company that produced this insight file
                 company_txt = self.comboCompany.currentText()
                 company = EnumTypes.Company.NA
@@ -119,16 +130,25 @@ class MainWindow(QDialog):
                     company = EnumTypes.Company.MOU
                 elif company_txt == "ABR":
                     company = EnumTypes.Company.ABR
+                # Load the lookup files once for the whole batch
+                lookups = LookupTables.load(company)
                 # Clean all selected files
-                for filepath in self.filepaths:
-                    # Strip root off path to get file name
-                    filename = os.path.basename(filepath)
-                    # Make sure the file is not already standardized
-                    if "Standardized" in filename:
-                        print(".." + filename + " has already been cleaned.")
-                        self.unlockButtons()
-                    else:
-                        Clean.main(filepath, company)
+                if lookups is not None:
+                    filepaths = []
+                    for filepath in self.filepaths:
+                        # Strip root off path to get file name
+                        filename = os.path.basename(filepath)
+                        # Make sure the file is not already standardized
+                        if "Standardized" in filename:
+                            print(".." + filename + " has already been cleaned.")
+                            self.unlockButtons()
+                        else:
+                            filepaths.append(filepath)
+                    # Spread multiple files across processes
+                    if len(filepaths) > 1:
+                        Clean.mainParallel(filepaths, company, lookups, CLEAN_WORKERS, incremental=INCREMENTAL_CLEAN)
+                    elif filepaths:
+                        Clean.main(filepaths[0], company, lookups, incremental=INCREMENTAL_CLEAN)
             except Exception as error:
                 print("..Unexpected Python error:\n" +
                       "?" + str(error) + "\n" +
@@ -172,6 +192,7 @@ class MainWindow(QDialog):
 
         # Run the Split.py file
         try:
+            import Split
             Split.main(self.filepaths[0])
         except Exception as error:
             print("..Unexpected Python error:\n" +
@@ -192,6 +213,7 @@ class MainWindow(QDialog):
 
         # Run the Compile.py file
         try:
+            import Compile
             Compile.main(self.filepaths)
         except Exception as error:
             print("..Unexpected Python error:\n" +
@@ -255,7 +277,7 @@ class MainWindow(QDialog):
 
         # Grab Excel file for operations
         self.filepaths, _ = QFileDialog.getOpenFileNames(
-            self, filter="Excel files (*.xls *.xlsx *.xlsm)")
+            self, filter="Excel or data files (*.xls *.xlsx *.xlsm *.csv *.parquet)")
 
         # Print out the selected filenames
         for filename in [os.path.basename(filepath) for filepath in self.filepaths]:
@@ -304,6 +326,19 @@ class Worker(QtCore.QRunnable):
         self.fn(*self.args, **self.kwargs)
 
 
+def reportStartupTime(app):
+    """Prints how long the window took to appear to the real console, then closes the program
+
+    :param app: running application
+    """
+
+    elapsed = time.perf_counter() - START_TIME
+    data_libraries = [module for module in ["pandas", "numpy", "openpyxl", "xlsxwriter"] if module in sys.modules]
+    sys.__stdout__.write("> Window shown " + str(round(elapsed, 3)) + "s after launch\n" +
+                         "> Data libraries loaded at startup: " + (", ".join(data_libraries) or "none") + "\n")
+    app.quit()
+
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     # widget container for QT Designer UI
@@ -315,7 +350,12 @@ if __name__ == '__main__':
     widget.setFixedHeight(600)
     widget.show()
 
-try:
-    sys.exit(app.exec_())
-except:
-    print("..Exiting")
+    # Measure time to first window: python main.py --startup-time
+    if "--startup-time" in sys.argv:
+        QtCore.QTimer.singleShot(0, lambda: reportStartupTime(app))
+
+    # Inside the guard so Clean's worker processes don't try to run the GUI
+    try:
+        sys.exit(app.exec_())
+    except:
+        print("..Exiting")
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import AssignSalesReps
+import EnumTypes
+import ExcelUtilities
+import LookupTables
+import Normalize
+
+
+def makeLookups():
+    """Small lookup tables with every kind of entry the cascade branches on
+
+    :return: lookup tables
+    """
+
+    root_column_library = pd.DataFrame({'Reported Customer': ["customer"], 'Zip Code': ["zip"]})
+    customer_to_proper_name_map = pd.DataFrame({
+        'Root Customer': ["Acme Inc", "Blank Co", "Ghost LLC", 12345, "Acme Inc", "nan"],
+        'ProperName': ["Acme Corp", "", "Ghost Corp", "Numeric Corp", "Later Corp", "Nan Corp"]})
+    mstr_account_list = pd.DataFrame({
+        'ProperName': ["ACME CORP", "Numeric Corp", "Direct Corp", "Acme Corp", "Nan Corp"],
+        'SLS': ["AB", "CD", "EF", "ZZ", "GH"]})
+    mstr_territory_list = pd.DataFrame({
+        # 94043 is listed twice (the first one wins), "95014" is text and never matches
+        'ZipCode': [94043, 94043, 95014.0, "95014", 2134, 99999],
+        'Sls': ["T1", "T2", "T3", "T4", "T5", "T6"]})
+
+    return LookupTables.LookupTables(root_column_library, customer_to_proper_name_map, mstr_account_list,
+                                     mstr_territory_list)
+
+
+def makeStandardFrame():
+    """Standardized rows covering every flag and the awkward customers and zip codes
+
+    :return: standardized data frame with blank OSR and Flag columns
+    """
+
+    rows = [
+        ("Acme Inc", "94043"),  # Mapped customer, found in account list
+        ("ACME CORP", "94043"),  # Already a proper name
+        ("Direct Corp", ""),  # Proper name only in account list
+        ("", "94043-1234"),  # CNP, found by territory
+        ("", "00000"),  # CNP, out of territory
+        ("Nobody Ltd", "95014"),  # CNF, found by territory
+        ("Nobody Ltd", "10001"),  # CNF, out of territory
+        ("Blank Co", "02134"),  # PNA, found by territory (leading zero)
+        ("Ghost LLC", "99999-0000"),  # PNF, found by territory
+        ("Ghost LLC", "12345-678"),  # PNF, malformed zip
+        (np.nan, "94043"),  # Missing customer reads as "nan"
+        ("nan", "94043"),  # Literal "nan"
+        (12345, "9404x"),  # Numeric customer, malformed zip
+        (12345.0, np.nan),  # Float customer never matches "12345"
+        ("Nobody Ltd", "ABCDE"),  # Malformed zip
+        ("Nobody Ltd", "123"),  # Too short
+        ("Nobody Ltd", 95014),  # Numeric zip
+        ("Nobody Ltd", np.nan),  # Missing zip
+    ]
+    std_df = pd.DataFrame(rows, columns=['Reported Customer', 'Zip Code'], dtype=object)
+    std_df['OSR'] = np.nan
+    std_df['Flag'] = np.nan
+    # A non-default index, as incremental Clean hands over
+    std_df.index = std_df.index * 3 + 7
+
+    return std_df.astype(object)
+
+
+@pytest.fixture
+def lookups(tmp_path, monkeypatch):
+    # Keep the resolution cache out of the real cache folder
+    monkeypatch.setattr(ExcelUtilities, "cache_dir", str(tmp_path))
+    return makeLookups()
+
+
+def assignedColumns(std_df):
+    return std_df[['OSR', 'Flag']].astype(object).where(std_df[['OSR', 'Flag']].notna(), None)
+
+
+def test_every_mode_matches_row_by_row(lookups):
+    std_df = makeStandardFrame()
+    zip_code_prefixes = Normalize.zipCodePrefixes(std_df['Zip Code'])
+
+    by_row = AssignSalesReps.assignByRow(std_df.copy(), lookups.sales_rep_index, zip_code_prefixes)
+    by_column = AssignSalesReps.assignByColumn(std_df.copy(), lookups.sales_rep_index, zip_code_prefixes)
+    resolution_cache = AssignSalesReps.ResolutionCache(lookups.sales_rep_fingerprint)
+    by_cache = AssignSalesReps.assignByCache(std_df.copy(), lookups, resolution_cache, zip_code_prefixes)
+    # Second pass answers everything from the cache
+    by_warm_cache = AssignSalesReps.assignByCache(std_df.copy(), lookups, resolution_cache, zip_code_prefixes)
+
+    expected = assignedColumns(by_row)
+    pd.testing.assert_frame_equal(assignedColumns(by_column), expected)
+    pd.testing.assert_frame_equal(assignedColumns(by_cache), expected)
+    pd.testing.assert_frame_equal(assignedColumns(by_warm_cache), expected)
+
+    # Every flag is covered
+    flags = set(expected['Flag'].dropna())
+    assert flags == {flag.value for flag in EnumTypes.Flag}
+
+
+def test_expected_assignments(lookups):
+    std_df = AssignSalesReps.main(makeStandardFrame(), lookups)
+    osr = std_df['OSR'].tolist()
+    flag = std_df['Flag'].tolist()
+
+    assert osr[:3] == ["AB", "AB", "EF"]
+    assert all(pd.isna(value) for value in flag[:3])
+    assert (osr[3], flag[3]) == ("T1", EnumTypes.Flag.CNP.value)  # First 94043 entry wins
+    assert flag[4] == EnumTypes.Flag.OOT.value
+    assert (osr[5], flag[5]) == ("T3", EnumTypes.Flag.CNF.value)  # Numeric roster zip
+    assert (osr[7], flag[7]) == ("T5", EnumTypes.Flag.PNA.value)
+    assert (osr[8], flag[8]) == ("T6", EnumTypes.Flag.PNF.value)
+    assert (osr[10], osr[11]) == ("GH", "GH")  # NaN and "nan" both resolve through "nan"
+    assert osr[12] == "CD"
+
+
+def test_resolution_cache_evicts_least_recently_used(lookups, monkeypatch):
+    monkeypatch.setattr(AssignSalesReps, "resolution_cache_size", 2)
+    resolution_cache = AssignSalesReps.ResolutionCache(lookups.sales_rep_fingerprint)
+
+    resolution_cache.customerEntries(["acme inc", "blank co"], lookups)
+    resolution_cache.customerEntries(["acme inc"], lookups)  # Now the most recently used
+    resolution_cache.customerEntries(["ghost llc"], lookups)
+
+    assert list(resolution_cache.customers) == ["acme inc", "ghost llc"]
+
+
+def test_resolution_cache_keeps_entries_saved_by_other_workers(lookups):
+    # Two workers start from the same (empty) saved cache and resolve different customers
+    first_worker = AssignSalesReps.loadResolutionCache(lookups.sales_rep_fingerprint)
+    second_worker = AssignSalesReps.loadResolutionCache(lookups.sales_rep_fingerprint)
+    first_worker.customerEntries(["acme inc"], lookups)
+    second_worker.customerEntries(["blank co"], lookups)
+    second_worker.zipCodeEntries(["94043"], lookups)
+
+    first_worker.save()
+    second_worker.save()
+
+    saved = AssignSalesReps.loadResolutionCache(lookups.sales_rep_fingerprint)
+    assert set(saved.customers) == {"acme inc", "blank co"}
+    assert list(saved.zip_codes) == ["94043"]
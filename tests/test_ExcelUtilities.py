@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ExcelUtilities
+
+
+def test_parquet_columns_keep_numbers_stored_as_text():
+    sheet_data = pd.DataFrame({'Customer Class': pd.Series(["01234", 95014], dtype=object),
+                               'Quantity': pd.Series([5, ""], dtype=object)})
+
+    parquet_data = ExcelUtilities.parquetColumns(sheet_data)
+
+    assert parquet_data['Customer Class'].tolist() == ["01234", "95014"]
+    assert parquet_data['Quantity'].tolist()[0] == 5 and np.isnan(parquet_data['Quantity'].tolist()[1])
+
+
+def test_parquet_stream_settles_types_across_blocks(tmp_path):
+    out_path = str(tmp_path / "Compiled.parquet")
+    header = ['Reported Customer', 'Quantity', 'How Contacted', 'Comments']
+    stream_writer = ExcelUtilities.DataStreamWriter(out_path, header)
+
+    # Blank in the first file, filled in the second; numbers in one file, text in the other
+    stream_writer.writeRows(pd.DataFrame({'Reported Customer': ["a", "b"], 'Quantity': [1, 2],
+                                          'How Contacted': [np.nan, np.nan], 'Comments': [3.5, np.nan]}))
+    stream_writer.writeRows(pd.DataFrame({'Reported Customer': ["c"], 'Quantity': [4.5],
+                                          'How Contacted': ["Email"], 'Comments': ["Call back"]}))
+    stream_writer.close()
+
+    compiled = pd.read_parquet(out_path)
+    assert compiled['Quantity'].tolist() == [1.0, 2.0, 4.5]
+    assert compiled['How Contacted'].tolist()[2] == "Email" and compiled['How Contacted'].isna().sum() == 2
+    assert compiled['Comments'].tolist()[0] == "3.5" and compiled['Comments'].tolist()[2] == "Call back"
+    # Only the compiled file is left
+    assert [path.name for path in tmp_path.iterdir()] == ["Compiled.parquet"]
+
+
+def test_failed_stream_removes_output_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(ExcelUtilities, "output_dir", str(tmp_path) + "/")
+    sheet_data = pd.DataFrame({'Reported Customer': ["a", "b"], 'Quantity': [1, 2]})
+
+    def failingWriteRows(self, block):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ExcelUtilities.StreamWriter, "writeRows", failingWriteRows)
+    with pytest.raises(OSError):
+        ExcelUtilities.writeExcelFile("Report.xlsx", sheet_data, stream=True)
+
+    stream_writer = ExcelUtilities.createStreamFile("Report.parquet", sheet_data.columns)
+    stream_writer.writeRows(sheet_data)
+    stream_writer.abort()
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_file_lock_takes_over_a_stale_lock(tmp_path):
+    cache_path = str(tmp_path / "resolutions.pkl")
+    # Left behind by a process that crashed while saving
+    open(cache_path + ".lock", 'w').close()
+
+    with ExcelUtilities.cacheFileLock(cache_path, timeout=0.1):
+        assert (tmp_path / "resolutions.pkl.lock").exists()
+
+    assert not (tmp_path / "resolutions.pkl.lock").exists()